@@ -6,44 +6,216 @@ AI图像识别模块，使用CLIP Interrogator识别图片内容并使用NLP判
 """
 
 import os
+import gc
 import sys
-import torch
-
-try:
-    import nltk
-    from nltk.corpus import stopwords
-
-    NLTK_AVAILABLE = True
-except ImportError:
-    print("警告: nltk库不可用，将使用简化版文本处理")
-    NLTK_AVAILABLE = False
-
+import math
+import time
+import queue
+import hashlib
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from PIL import Image
 
-try:
-    from transformers import CLIPProcessor, CLIPModel
-    import open_clip
-
-    CLIP_AVAILABLE = True
-except ImportError:
-    print("警告: transformers或open_clip库不可用，将使用简化版图像分析")
-    CLIP_AVAILABLE = False
-
 import config
+import capa_index
+import image_cache
+import image_processor
+import embedding_store
 import random
 
-# 下载nltk数据
-if NLTK_AVAILABLE:
-    try:
-        stopwords.words("english")
-    except LookupError:
-        nltk.download("stopwords")
+# torch、open_clip、transformers和nltk在第一次使用时才导入，
+# 不使用AI功能的运行（如手动模式）不需要承担导入这些库的时间和内存
+torch = None
+open_clip = None
+nltk = None
+
+# 库是否可用，None表示尚未检测
+_clip_available = None
+_nltk_available = None
+_stopwords = None
+
+# "之前"图片相关词汇
+BEFORE_KEYWORDS = [
+    "before",
+    "messy",
+    "dirty",
+    "unsafe",
+    "hazard",
+    "violation",
+    "disorganized",
+    "cluttered",
+    "dangerous",
+    "risky",
+    "precarious",
+    "unstable",
+    "insecure",
+    "unprotected",
+    "unguarded",
+    "unshielded",
+]
+
+# "之后"图片相关词汇
+AFTER_KEYWORDS = [
+    "after",
+    "clean",
+    "tidy",
+    "safe",
+    "organized",
+    "neat",
+    "secure",
+    "stable",
+    "protected",
+    "guarded",
+    "shielded",
+    "improvement",
+]
+
+# "之前/之后"分类器使用的描述集合，分别取文本向量的中心作为两个类别的代表向量
+BEFORE_PROMPTS = [
+    "a photo of a messy workplace",
+    "a photo of a cluttered work area",
+    "a photo of a safety hazard",
+    "a photo of an unsafe condition",
+    "a photo of a dirty floor",
+    "a photo of a blocked walkway",
+    "a photo of exposed wires",
+    "a photo of a damaged guard rail",
+    "a photo of materials stored improperly",
+    "a photo of a spill on the floor",
+    "a photo of a safety violation",
+    "a photo of a disorganized storage area",
+]
+AFTER_PROMPTS = [
+    "a photo of a clean workplace",
+    "a photo of an organized work area",
+    "a photo of a safe condition",
+    "a photo of a hazard that has been fixed",
+    "a photo of a clean floor",
+    "a photo of a clear walkway",
+    "a photo of neatly covered cables",
+    "a photo of a repaired guard rail",
+    "a photo of materials stored neatly",
+    "a photo of a tidy area after cleaning",
+    "a photo of a workplace after improvement",
+    "a photo of a well organized storage area",
+]
 
 # 全局变量，用于存储模型，避免重复加载
 _clip_model = None
 _clip_processor = None
-_clip_interrogator = None
+_clip_interrogators = {}  # 模型名称到CLIP Interrogator实例的映射
+
+# fork产生AI工作进程前设置，工作进程通过它使用父进程中已加载的模型
+_pool_interrogator = None
+
+# CAPA描述的文本向量 (描述元组, {(模型名称, 预训练权重): 文本向量})
+_catalog_features = None
+
+# 按模型名称保存的"之前/之后"中心向量和线性探针
+_class_centroids = {}
+_linear_probes = {}
+
+# 级联判断时确定每个"之前"图片的模型名称（None表示亮度统计），语义描述匹配使用同一个模型
+_decision_models = {}
+
+
+def _import_clip():
+    """
+    导入torch和open_clip（只在第一次调用时导入）
+
+    Returns:
+        bool: CLIP相关库是否可用
+    """
+    global torch, open_clip, _clip_available
+
+    if _clip_available is None:
+        try:
+            import torch as _torch
+            import open_clip as _open_clip
+
+            torch = _torch
+            open_clip = _open_clip
+            _clip_available = True
+        except ImportError:
+            print("警告: torch或open_clip库不可用，将使用简化版图像分析")
+            _clip_available = False
+
+    return _clip_available
+
+
+def _import_nltk():
+    """
+    导入nltk（只在第一次调用时导入）
+
+    Returns:
+        bool: nltk是否可用
+    """
+    global nltk, _nltk_available
+
+    if _nltk_available is None:
+        try:
+            import nltk as _nltk
+
+            nltk = _nltk
+            _nltk_available = True
+        except ImportError:
+            print("警告: nltk库不可用，将使用简化版文本处理")
+            _nltk_available = False
+
+    return _nltk_available
+
+
+def __getattr__(name):
+    """
+    模块属性CLIP_AVAILABLE和NLTK_AVAILABLE在第一次访问时才检测对应的库
+    """
+    if name == "CLIP_AVAILABLE":
+        return _import_clip()
+    if name == "NLTK_AVAILABLE":
+        return _import_nltk()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _cpu_supports_bf16():
+    """
+    检测当前CPU是否支持bfloat16加速（AVX512-BF16或AMX）
+
+    Returns:
+        bool: 是否支持
+    """
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def get_stopwords():
+    """
+    获取英文停用词表，第一次使用时才加载（本地没有数据时尝试下载）
+
+    Returns:
+        set: 停用词集合，nltk不可用或数据无法获取时返回空集合
+    """
+    global _stopwords
+
+    if _stopwords is None:
+        _stopwords = set()
+        if _import_nltk():
+            from nltk.corpus import stopwords
+
+            try:
+                _stopwords = set(stopwords.words("english"))
+            except LookupError:
+                try:
+                    nltk.download("stopwords", quiet=True)
+                    _stopwords = set(stopwords.words("english"))
+                except Exception as e:
+                    print(f"获取nltk停用词表失败，将不去除停用词: {e}")
+
+    return _stopwords
 
 
 def load_clip_model():
@@ -57,6 +229,8 @@ def load_clip_model():
 
     if _clip_model is None or _clip_processor is None:
         try:
+            from transformers import CLIPProcessor, CLIPModel
+
             print("正在加载CLIP模型...")
             _clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
             _clip_processor = CLIPProcessor.from_pretrained(
@@ -74,244 +248,707 @@ def load_clip_model():
 class ClipInterrogator:
     """CLIP Interrogator类，用于识别图片内容"""
 
-    def __init__(self):
+    def __init__(self, model_name=None, pretrained=None, precision=None):
+        """
+        Args:
+            model_name (str, optional): CLIP模型名称，如果为None则使用配置中的模型
+            pretrained (str, optional): 预训练权重名称，如果为None则使用配置中的权重
+            precision (str, optional): 图像编码器的推理精度（fp32、int8、bf16），
+                                       如果为None则使用配置中的精度
+        """
         # 如果CLIP库不可用，抛出异常
-        if not CLIP_AVAILABLE:
+        if not _import_clip():
             raise ImportError("CLIP库不可用，无法初始化CLIP Interrogator")
 
-        print("初始化CLIP Interrogator...")
+        self.model_name = model_name or config.CLIP_MODEL
+        self.pretrained = pretrained or config.CLIP_PRETRAINED
+        self.precision = precision or config.CLIP_PRECISION
+
+        print(f"初始化CLIP Interrogator ({self.model_name}, {self.precision})...")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
 
+        if config.CLIP_NUM_THREADS:
+            torch.set_num_threads(config.CLIP_NUM_THREADS)
+
+        # 加载模型和预处理函数（优先使用本地模型缓存）
+        self.clip_model, self.clip_preprocess = self._load_model()
+
+        self.clip_model.eval()
+        self._apply_precision()
+
+        self.tokenizer = open_clip.get_tokenizer(self.model_name)
+
+        # 模型输入尺寸，用于JPEG降采样解码（解码后的尺寸不小于输入尺寸）
+        image_size = getattr(self.clip_model.visual, "image_size", 224)
+        if isinstance(image_size, int):
+            image_size = (image_size, image_size)
+        self.image_size = tuple(image_size)
+
+        # 加载描述词表，并预先计算（或从缓存读取）描述词的文本向量
+        self.prompts = load_prompts()
+        self.text_features = self._load_text_features(self.prompts)
+
+        # 图片向量存储（首次使用时打开）
+        self._embedding_store = None
+
+        # 最近一次图片编码流水线的统计信息
+        self.pipeline_stats = None
+        print(f"CLIP Interrogator初始化完成，使用设备: {self.device}")
+
+    def _create_model(self):
+        """
+        使用open_clip创建模型并加载预训练权重
+
+        Returns:
+            tuple: (model, preprocess)
+        """
         # 修复：正确处理open_clip.create_model_and_transforms()返回的值
         model_and_transforms = open_clip.create_model_and_transforms(
-            "ViT-L-14", pretrained="openai", device=self.device
+            self.model_name, pretrained=self.pretrained, device=self.device
         )
 
         # 解包返回值，可能返回3个或4个值
         if isinstance(model_and_transforms, tuple):
             if len(model_and_transforms) == 3:
-                self.clip_model, self.clip_preprocess, _ = model_and_transforms
+                model, preprocess, _ = model_and_transforms
             elif len(model_and_transforms) == 4:
-                self.clip_model, self.clip_preprocess, _, _ = model_and_transforms
+                model, preprocess, _, _ = model_and_transforms
             else:
                 # 如果返回值格式变化，使用更安全的方式
-                self.clip_model = model_and_transforms[0]
-                self.clip_preprocess = model_and_transforms[1]
+                model = model_and_transforms[0]
+                preprocess = model_and_transforms[1]
         else:
             # 如果返回值不是元组，可能是单个对象
-            self.clip_model = model_and_transforms
-            self.clip_preprocess = None
             raise ValueError("无法获取CLIP模型和预处理函数")
 
-        self.tokenizer = open_clip.get_tokenizer("ViT-L-14")
-        print(f"CLIP Interrogator初始化完成，使用设备: {self.device}")
+        return model, preprocess
 
-    def interrogate(self, image_path, max_flavors=3):
+    def _load_model(self):
         """
-        识别图片内容
+        加载CLIP模型，优先从本地模型缓存加载
+
+        第一次加载时将构建好的模型（fp32权重）保存到本地缓存，之后直接使用内存映射加载，
+        不需要重新构建模型、转换权重，也不需要访问预训练权重的下载缓存（可以离线运行）
+
+        Returns:
+            tuple: (model, preprocess)
+        """
+        start_time = time.perf_counter()
+        cache_file = os.path.join(
+            config.CLIP_MODEL_CACHE_DIR,
+            f"{self.model_name}_{self.pretrained}_open_clip-{open_clip.__version__}.pt",
+        )
+
+        if config.CLIP_MODEL_CACHE_ENABLED and os.path.exists(cache_file):
+            try:
+                # CPU上使用内存映射加载，权重直接映射到缓存文件，不复制
+                checkpoint = torch.load(
+                    cache_file,
+                    map_location="cpu",
+                    mmap=self.device == "cpu",
+                    weights_only=False,
+                )
+                model = checkpoint["model"].to(self.device)
+                print(
+                    f"CLIP模型加载完成（本地模型缓存），耗时 {time.perf_counter() - start_time:.2f} 秒"
+                )
+                return model, checkpoint["preprocess"]
+            except Exception as e:
+                print(f"读取本地模型缓存失败，将重新加载模型: {e}")
+
+        model, preprocess = self._create_model()
+        print(f"CLIP模型加载完成（预训练权重），耗时 {time.perf_counter() - start_time:.2f} 秒")
+
+        if config.CLIP_MODEL_CACHE_ENABLED:
+            try:
+                os.makedirs(config.CLIP_MODEL_CACHE_DIR, exist_ok=True)
+                # 先写入临时文件再重命名，避免保存中断后留下不完整的缓存
+                temp_file = f"{cache_file}.{os.getpid()}.tmp"
+                torch.save({"model": model, "preprocess": preprocess}, temp_file)
+                os.replace(temp_file, cache_file)
+                print(f"已保存本地模型缓存: {cache_file}")
+            except Exception as e:
+                print(f"保存本地模型缓存失败: {e}")
+
+        return model, preprocess
+
+    def _apply_precision(self):
+        """
+        按推理精度设置图像编码器：int8对线性层做动态量化，bf16在CPU支持时使用自动混合精度，
+        不支持时回退到fp32。文本编码器保持fp32（描述词向量只计算一次并缓存）
+        """
+        if self.precision == "int8":
+            if self.device != "cpu":
+                print("int8动态量化只支持CPU，将使用fp32")
+                self.precision = "fp32"
+                return
+            self.clip_model.visual = torch.ao.quantization.quantize_dynamic(
+                self.clip_model.visual, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            print("已对图像编码器的线性层进行int8动态量化")
+
+        elif self.precision == "bf16":
+            if self.device == "cpu" and not _cpu_supports_bf16():
+                print("当前CPU不支持bfloat16加速，将使用fp32")
+                self.precision = "fp32"
+
+        elif self.precision != "fp32":
+            print(f"未知的推理精度: {self.precision}，将使用fp32")
+            self.precision = "fp32"
+
+    def _image_inference_context(self):
+        """
+        图像编码使用的推理上下文（inference_mode，bf16时加上自动混合精度）
+
+        Returns:
+            contextlib.ExitStack: 上下文管理器
+        """
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.precision == "bf16":
+            device_type = "cuda" if self.device == "cuda" else "cpu"
+            stack.enter_context(torch.autocast(device_type, dtype=torch.bfloat16))
+        return stack
+
+    def encode_texts(self, texts, batch_size=256):
+        """
+        使用CLIP文本编码器计算文本向量
+
+        Args:
+            texts (list): 文本列表
+            batch_size (int): 每批编码的文本数量
+
+        Returns:
+            torch.Tensor: 归一化后的文本向量矩阵，形状为 (len(texts), dim)
+        """
+        features = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), batch_size):
+                tokens = self.tokenizer(texts[start : start + batch_size]).to(self.device)
+                batch_features = self.clip_model.encode_text(tokens).float()
+                batch_features /= batch_features.norm(dim=-1, keepdim=True)
+                features.append(batch_features)
+
+        return torch.cat(features)
+
+    def _load_text_features(self, prompts):
+        """
+        加载描述词的文本向量矩阵，按模型名称和词表哈希缓存在磁盘上
+
+        Args:
+            prompts (list): 描述词列表
+
+        Returns:
+            torch.Tensor: 归一化后的文本向量矩阵
+        """
+        return load_text_features(self, prompts, "text")
+
+    def _load_image_tensor(self, image_path):
+        """
+        加载并预处理单张图片
 
         Args:
             image_path (str): 图片路径
-            max_flavors (int): 最大描述数量
 
         Returns:
-            str: 图片内容描述
+            torch.Tensor: 预处理后的图片张量，无法读取时返回None
         """
         try:
-            # 加载图片
-            image = Image.open(image_path).convert("RGB")
-
-            # 预处理图片
-            image_tensor = self.clip_preprocess(image).unsqueeze(0).to(self.device)
-
-            # 准备一些常见的描述词
-            descriptions = [
-                "construction site",
-                "safety hazard",
-                "workplace safety",
-                "construction safety",
-                "safety violation",
-                "safety equipment",
-                "protective gear",
-                "hard hat",
-                "safety vest",
-                "safety goggles",
-                "safety gloves",
-                "safety boots",
-                "safety harness",
-                "safety sign",
-                "warning sign",
-                "danger sign",
-                "caution sign",
-                "safety barrier",
-                "safety fence",
-                "safety net",
-                "safety tape",
-                "safety cone",
-                "safety ladder",
-                "safety scaffold",
-                "safety platform",
-                "safety rail",
-                "safety guard",
-                "safety cover",
-                "safety lock",
-                "safety switch",
-                "safety valve",
-                "safety sensor",
-                "safety alarm",
-                "safety light",
-                "safety camera",
-                "safety monitor",
-                "safety inspection",
-                "safety audit",
-                "safety training",
-                "safety meeting",
-                "safety briefing",
-                "safety plan",
-                "safety policy",
-                "safety procedure",
-                "safety protocol",
-                "safety standard",
-                "safety regulation",
-                "safety requirement",
-                "safety guideline",
-                "safety manual",
-                "safety handbook",
-                "safety report",
-                "safety record",
-                "safety certificate",
-                "safety certification",
-                "safety compliance",
-                "safety violation",
-                "safety incident",
-                "safety accident",
-                "safety injury",
-                "safety fatality",
-                "safety near miss",
-                "safety hazard",
-                "safety risk",
-                "safety danger",
-                "safety threat",
-                "safety emergency",
-                "safety crisis",
-                "safety disaster",
-                "safety catastrophe",
-                "clean workplace",
-                "organized workplace",
-                "tidy workplace",
-                "neat workplace",
-                "messy workplace",
-                "disorganized workplace",
-                "cluttered workplace",
-                "dirty workplace",
-                "unsafe condition",
-                "safe condition",
-                "hazardous condition",
-                "dangerous condition",
-                "risky condition",
-                "precarious condition",
-                "unstable condition",
-                "stable condition",
-                "secure condition",
-                "insecure condition",
-                "protected condition",
-                "unprotected condition",
-                "guarded condition",
-                "unguarded condition",
-                "shielded condition",
-                "unshielded condition",
-                "before repair",
-                "after repair",
-                "before maintenance",
-                "after maintenance",
-                "before cleaning",
-                "after cleaning",
-                "before organizing",
-                "after organizing",
-                "before fixing",
-                "after fixing",
-                "before improvement",
-                "after improvement",
-                "before renovation",
-                "after renovation",
-                "before restoration",
-                "after restoration",
-                "before upgrade",
-                "after upgrade",
-                "before update",
-                "after update",
-                "before modification",
-                "after modification",
-                "before alteration",
-                "after alteration",
-                "before transformation",
-                "after transformation",
-                "before conversion",
-                "after conversion",
-                "before change",
-                "after change",
-                "before adjustment",
-                "after adjustment",
-                "before correction",
-                "after correction",
-                "before rectification",
-                "after rectification",
-                "before remediation",
-                "after remediation",
-                "before treatment",
-                "after treatment",
-            ]
+            # 加载图片（JPEG降采样解码到接近模型输入尺寸）
+            image = image_processor.load_image(image_path, self.image_size)
+            return self.clip_preprocess(image)
+        except Exception as e:
+            print(f"读取图片出错 ({os.path.basename(image_path)}): {e}")
+            return None
 
-            # 计算图片与描述的相似度
-            text_tokens = self.tokenizer(descriptions).to(self.device)
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_tensor)
-                text_features = self.clip_model.encode_text(text_tokens)
+    def _get_embedding_store(self):
+        """
+        获取当前模型的图片向量存储
+
+        Returns:
+            EmbeddingStore: 图片向量存储，如果未启用则返回None
+        """
+        if not config.CLIP_EMBEDDING_STORE_ENABLED:
+            return None
+
+        if self._embedding_store is None:
+            # 降低精度后的向量与fp32不完全相同，分开保存
+            model_key = f"{self.model_name}_{self.pretrained}"
+            if self.precision != "fp32":
+                model_key += f"_{self.precision}"
+            self._embedding_store = embedding_store.EmbeddingStore(
+                model_key, self.text_features.shape[1]
+            )
+        return self._embedding_store
+
+    def encode_images(self, image_paths, batch_size=None):
+        """
+        分批计算图片向量，内容没有变化的图片直接使用向量存储中保存的向量
+
+        Args:
+            image_paths (list): 图片路径列表
+            batch_size (int, optional): 每批编码的图片数量，如果为None则使用配置中的批大小
+
+        Returns:
+            torch.Tensor: 归一化后的图片向量矩阵，形状为 (len(image_paths), dim)，
+                          无法读取的图片对应的行全为0
+        """
+        if batch_size is None:
+            batch_size = config.CLIP_BATCH_SIZE
+
+        features = torch.zeros(
+            (len(image_paths), self.text_features.shape[1]), device=self.device
+        )
+
+        # 按图片内容哈希查找已保存的向量
+        store = self._get_embedding_store()
+        keys = [None] * len(image_paths)
+        stored = {}
+        if store is not None:
+            for i, path in enumerate(image_paths):
+                try:
+                    keys[i] = image_cache.file_hash(path)
+                except OSError as e:
+                    print(f"读取图片出错 ({os.path.basename(path)}): {e}")
+            stored = store.get([key for key in keys if key])
+
+        pending = []
+        for i, key in enumerate(keys):
+            if key in stored:
+                vector = torch.from_numpy(stored[key]).to(self.device)
+                features[i] = vector / vector.norm()
+            else:
+                pending.append(i)
+
+        if store is not None:
+            print(f"向量存储命中 {len(image_paths) - len(pending)}/{len(image_paths)} 张图片")
+
+        new_vectors = {}
+        if pending:
+            pending_features = self._encode_parallel(
+                [image_paths[i] for i in pending], batch_size
+            )
+            features[pending] = pending_features
 
-                image_features /= image_features.norm(dim=-1, keepdim=True)
-                text_features /= text_features.norm(dim=-1, keepdim=True)
+            for i, vector in zip(pending, pending_features.cpu().numpy()):
+                # 无法读取的图片向量全为0，不保存
+                if keys[i] and vector.any():
+                    new_vectors[keys[i]] = vector
 
-                similarity = (100.0 * image_features @ text_features.T).softmax(dim=-1)
-                values, indices = similarity[0].topk(max_flavors)
+        if store is not None and new_vectors:
+            store.put(new_vectors)
 
-            # 获取最相似的描述
-            top_descriptions = [descriptions[idx] for idx in indices]
+        return features
+
+    def _encode_batches(self, image_paths, batch_size):
+        """
+        在当前进程中分批运行图像编码器
+
+        图片的解码和预处理由后台线程完成，预处理好的张量放入有界队列，推理循环从队列中
+        按批取出，使解码和模型推理同时进行。结束后打印各阶段的等待时间和队列深度，
+        推理等待时间长说明解码是瓶颈，解码线程等待时间长说明推理是瓶颈
+
+        Args:
+            image_paths (list): 图片路径列表
+            batch_size (int): 每批编码的图片数量
+
+        Returns:
+            torch.Tensor: 归一化后的图片向量矩阵，无法读取的图片对应的行全为0
+        """
+        features = torch.zeros(
+            (len(image_paths), self.text_features.shape[1]), device=self.device
+        )
+        if not image_paths:
+            return features
+
+        threads = config.CLIP_PREFETCH_THREADS
+        if not threads or threads <= 0:
+            # 不使用预取，在当前线程中依次解码和推理
+            for start in range(0, len(image_paths), batch_size):
+                batch = [
+                    (start + i, self._load_image_tensor(path))
+                    for i, path in enumerate(image_paths[start : start + batch_size])
+                ]
+                self._encode_batch(batch, features)
+                print(
+                    f"CLIP图片编码进度: {min(start + batch_size, len(image_paths))}/{len(image_paths)}"
+                )
+            return features
+
+        queue_size = config.CLIP_PREFETCH_QUEUE_SIZE or 2 * batch_size
+        tasks = queue.Queue()
+        for index, path in enumerate(image_paths):
+            tasks.put((index, path))
+        ready = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        stats = {
+            "decode_seconds": 0.0,
+            "decode_blocked_seconds": 0.0,
+            "inference_seconds": 0.0,
+            "inference_wait_seconds": 0.0,
+            "queue_depths": [],
+        }
+        stats_lock = threading.Lock()
+
+        def producer():
+            while not stop.is_set():
+                try:
+                    index, path = tasks.get_nowait()
+                except queue.Empty:
+                    return
+
+                start_time = time.perf_counter()
+                item = (index, self._load_image_tensor(path))
+                decoded_time = time.perf_counter()
+
+                # 队列已满时等待推理循环取走数据
+                while not stop.is_set():
+                    try:
+                        ready.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+
+                with stats_lock:
+                    stats["decode_seconds"] += decoded_time - start_time
+                    stats["decode_blocked_seconds"] += time.perf_counter() - decoded_time
+
+        workers = [
+            threading.Thread(target=producer, daemon=True)
+            for _ in range(min(threads, len(image_paths)))
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            done = 0
+            while done < len(image_paths):
+                # 推理前的队列深度，接近0说明解码跟不上推理
+                stats["queue_depths"].append(ready.qsize())
+
+                start_time = time.perf_counter()
+                batch = [ready.get()]
+                while len(batch) < min(batch_size, len(image_paths) - done):
+                    batch.append(ready.get())
+                stats["inference_wait_seconds"] += time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                self._encode_batch(batch, features)
+                stats["inference_seconds"] += time.perf_counter() - start_time
+
+                done += len(batch)
+                print(f"CLIP图片编码进度: {done}/{len(image_paths)}")
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        self.pipeline_stats = stats
+        _print_pipeline_stats(stats, len(workers), queue_size)
+        return features
+
+    def _encode_batch(self, batch, features):
+        """
+        对一批预处理好的图片运行图像编码器，结果写入向量矩阵
+
+        Args:
+            batch (list): 元组 (index, tensor) 列表，无法读取的图片tensor为None
+            features (torch.Tensor): 结果向量矩阵
+        """
+        valid = [(index, tensor) for index, tensor in batch if tensor is not None]
+        if not valid:
+            return
+
+        image_tensor = torch.stack([tensor for _, tensor in valid]).to(self.device)
+        with self._image_inference_context():
+            valid_features = self.clip_model.encode_image(image_tensor).float()
+            valid_features /= valid_features.norm(dim=-1, keepdim=True)
+        features[[index for index, _ in valid]] = valid_features
+
+    def _encode_parallel(self, image_paths, batch_size):
+        """
+        使用多个工作进程编码图片。工作进程由当前进程fork产生，与当前进程共享同一份模型权重
+        （写时复制），总内存占用接近一份模型，CPU吞吐量随进程数增加
+
+        Args:
+            image_paths (list): 图片路径列表
+            batch_size (int): 每批编码的图片数量
+
+        Returns:
+            torch.Tensor: 归一化后的图片向量矩阵，无法读取的图片对应的行全为0
+        """
+        global _pool_interrogator
+
+        workers = min(config.AI_WORKERS or 1, math.ceil(len(image_paths) / batch_size))
+        if (
+            workers <= 1
+            or self.device != "cpu"
+            or "fork" not in multiprocessing.get_all_start_methods()
+        ):
+            return self._encode_batches(image_paths, batch_size)
+
+        # 每个工作进程处理连续的一段图片，结果按顺序拼接
+        slice_size = math.ceil(len(image_paths) / workers)
+        slices = [
+            image_paths[start : start + slice_size]
+            for start in range(0, len(image_paths), slice_size)
+        ]
+        # 平分CPU线程，避免多个进程争抢
+        threads = max(1, torch.get_num_threads() // len(slices))
+
+        _pool_interrogator = self
+        # 冻结当前的Python对象，避免子进程中的垃圾回收修改对象头导致内存页被复制
+        gc.freeze()
+        try:
+            print(f"使用 {len(slices)} 个进程并行编码 {len(image_paths)} 张图片")
+            with ProcessPoolExecutor(
+                max_workers=len(slices),
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_ai_worker,
+                initargs=(threads,),
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _encode_images_job, [(paths, batch_size) for paths in slices]
+                    )
+                )
+            return torch.cat([torch.from_numpy(result) for result in results])
+        except Exception as e:
+            print(f"并行编码图片时出错: {e}，改为在当前进程中编码")
+            return self._encode_batches(image_paths, batch_size)
+        finally:
+            gc.unfreeze()
+            _pool_interrogator = None
+
+    def describe_features(self, image_features, max_flavors=3, image_paths=None):
+        """
+        根据图片向量选出最相似的描述
+
+        Args:
+            image_features (torch.Tensor): 归一化后的图片向量矩阵
+            max_flavors (int): 每张图片的最大描述数量
+            image_paths (list, optional): 图片路径列表，仅用于打印日志
+
+        Returns:
+            list: 每张图片最相似的描述列表
+        """
+        with torch.inference_mode():
+            similarity = (100.0 * image_features @ self.text_features.T).softmax(dim=-1)
+            values, indices = similarity.topk(max_flavors, dim=-1)
+
+        results = []
+        for row, (row_values, row_indices) in enumerate(zip(values, indices)):
+            # 无法读取的图片向量全为0
+            if not image_features[row].any():
+                results.append(["unknown content"])
+                continue
+
+            top_descriptions = [self.prompts[idx] for idx in row_indices.tolist()]
+            results.append(top_descriptions)
 
             # 添加日志记录
-            print(f"CLIP识别结果 ({os.path.basename(image_path)}):")
-            for i, (desc, val) in enumerate(zip(top_descriptions, values)):
+            name = os.path.basename(image_paths[row]) if image_paths else row
+            print(f"CLIP识别结果 ({name}):")
+            for i, (desc, val) in enumerate(zip(top_descriptions, row_values)):
                 print(f"  {i+1}. {desc} (置信度: {val.item():.2f})")
 
-            return top_descriptions
+        return results
+
+    def interrogate_batch(self, image_paths, max_flavors=3, batch_size=None):
+        """
+        批量识别图片内容
+
+        Args:
+            image_paths (list): 图片路径列表
+            max_flavors (int): 每张图片的最大描述数量
+            batch_size (int, optional): 每批编码的图片数量，如果为None则使用配置中的批大小
+
+        Returns:
+            list: 每张图片最相似的描述列表
+        """
+        try:
+            image_features = self.encode_images(image_paths, batch_size)
+            return self.describe_features(image_features, max_flavors, image_paths)
 
         except Exception as e:
             print(f"图片识别出错: {e}")
-            return ["unknown content"]
+            return [["unknown content"] for _ in image_paths]
 
+    def interrogate(self, image_path, max_flavors=3):
+        """
+        识别图片内容
 
-def get_clip_interrogator():
+        描述词的文本向量在初始化时已经计算好，每张图片只需要一次图像编码和一次矩阵乘法
+
+        Args:
+            image_path (str): 图片路径
+            max_flavors (int): 最大描述数量
+
+        Returns:
+            list: 最相似的描述列表
+        """
+        return self.interrogate_batch([image_path], max_flavors)[0]
+
+
+def _print_pipeline_stats(stats, threads, queue_size):
+    """
+    打印图片编码流水线各阶段的统计信息
+
+    Args:
+        stats (dict): 流水线统计信息
+        threads (int): 解码线程数
+        queue_size (int): 队列容量
+    """
+    depths = stats["queue_depths"]
+    average_depth = sum(depths) / len(depths) if depths else 0.0
+
+    print(
+        f"CLIP编码流水线: 解码线程 {threads} 个，"
+        f"解码 {stats['decode_seconds']:.2f} 秒（等待队列空位 {stats['decode_blocked_seconds']:.2f} 秒），"
+        f"推理 {stats['inference_seconds']:.2f} 秒（等待数据 {stats['inference_wait_seconds']:.2f} 秒），"
+        f"平均队列深度 {average_depth:.1f}/{queue_size}"
+    )
+    if stats["inference_wait_seconds"] > stats["decode_blocked_seconds"]:
+        print("  瓶颈: 图片解码和预处理（可以增加CLIP_PREFETCH_THREADS）")
+    else:
+        print("  瓶颈: 模型推理")
+
+
+def _init_ai_worker(threads):
+    """
+    AI工作进程初始化函数，设置每个进程的推理线程数
+
+    Args:
+        threads (int): 推理线程数
+    """
+    torch.set_num_threads(threads)
+
+
+def _encode_images_job(job):
+    """
+    AI工作进程任务入口，使用从父进程继承的模型编码一段图片
+
+    Args:
+        job (tuple): (image_paths, batch_size)
+
+    Returns:
+        numpy.ndarray: 归一化后的图片向量矩阵
+    """
+    image_paths, batch_size = job
+    return _pool_interrogator._encode_batches(image_paths, batch_size).cpu().numpy()
+
+
+def load_text_features(interrogator, texts, prefix):
+    """
+    计算文本向量矩阵，按模型名称和文本内容的哈希缓存在磁盘上
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例（也可以是AI推理服务的客户端）
+        texts (list): 文本列表
+        prefix (str): 缓存文件名前缀，如"text"（描述词表）、"capa"（CAPA描述）
+
+    Returns:
+        torch.Tensor: 归一化后的文本向量矩阵
+    """
+    texts_hash = hashlib.sha256(
+        "\n".join([interrogator.model_name, interrogator.pretrained] + texts).encode("utf-8")
+    ).hexdigest()[:16]
+    cache_file = os.path.join(
+        config.CLIP_EMBEDDING_CACHE_DIR,
+        f"{prefix}_{interrogator.model_name}_{texts_hash}.npy",
+    )
+
+    if os.path.exists(cache_file):
+        print(f"使用缓存的文本向量: {cache_file}")
+        return torch.from_numpy(np.load(cache_file)).to(interrogator.device)
+
+    print(f"正在计算 {len(texts)} 条文本的向量...")
+    text_features = interrogator.encode_texts(texts)
+
+    os.makedirs(config.CLIP_EMBEDDING_CACHE_DIR, exist_ok=True)
+    np.save(cache_file, text_features.cpu().numpy())
+    return text_features
+
+
+def load_prompts(prompts_file=None):
+    """
+    从文件中读取CLIP Interrogator使用的描述词表
+
+    Args:
+        prompts_file (str, optional): 描述词文件路径，如果为None则使用配置中的路径
+
+    Returns:
+        list: 描述词列表（去除空行、注释和重复项，保持原有顺序）
+    """
+    if prompts_file is None:
+        prompts_file = config.CLIP_PROMPTS_FILE
+
+    with open(prompts_file, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+def get_clip_interrogator(model_name=None):
     """
     获取CLIP Interrogator实例
 
+    Args:
+        model_name (str, optional): CLIP模型名称，如果为None则使用配置中的模型
+
     Returns:
         ClipInterrogator: CLIP Interrogator实例，如果不可用则返回None
     """
-    global _clip_interrogator
+    if model_name is None:
+        model_name = config.CLIP_MODEL
 
     # 如果CLIP库不可用，直接返回None
-    if not CLIP_AVAILABLE:
+    if not _import_clip():
         print("CLIP库不可用，将使用简化版图片识别功能")
         return None
 
-    if _clip_interrogator is None:
+    interrogator = _clip_interrogators.get(model_name)
+
+    if interrogator is None and config.AI_SERVER_ENABLED:
+        # 优先使用常驻的本地AI推理服务，避免重复加载模型
+        import ai_server
+
+        interrogator = ai_server.connect(model_name)
+
+    if interrogator is None:
         try:
-            _clip_interrogator = ClipInterrogator()
+            interrogator = ClipInterrogator(model_name)
         except Exception as e:
             print(f"初始化CLIP Interrogator失败: {e}")
             print("将使用简化版图片识别功能")
-            _clip_interrogator = None
+            interrogator = None
 
-    return _clip_interrogator
+    if interrogator is not None:
+        _clip_interrogators[model_name] = interrogator
+
+    return interrogator
+
+
+def image_statistics(image_path):
+    """
+    计算图片的亮度和对比度（在降采样后的灰度图上计算）
+
+    Args:
+        image_path (str): 图片路径
+
+    Returns:
+        tuple: (brightness, contrast)，亮度为平均灰度，对比度为灰度标准差
+    """
+    # 加载图片（亮度和对比度统计不需要完整分辨率）
+    image = image_processor.load_image(
+        image_path, (config.AI_ANALYSIS_IMAGE_SIZE, config.AI_ANALYSIS_IMAGE_SIZE)
+    )
+
+    # 将图片转换为灰度图
+    gray_image = np.array(image.convert("L"))
+
+    # 计算平均亮度和对比度
+    return float(np.mean(gray_image)), float(np.std(gray_image))
 
 
 def simple_image_analysis(image_path):
@@ -325,18 +962,7 @@ def simple_image_analysis(image_path):
         list: 图片内容描述列表
     """
     try:
-        # 加载图片
-        image = Image.open(image_path).convert("RGB")
-
-        # 计算图片的亮度、对比度等基本特征
-        # 将图片转换为灰度图
-        gray_image = image.convert("L")
-
-        # 计算平均亮度
-        brightness = np.mean(np.array(gray_image))
-
-        # 计算对比度
-        contrast = np.std(np.array(gray_image))
+        brightness, contrast = image_statistics(image_path)
 
         print(
             f"图片分析 ({os.path.basename(image_path)}) - 亮度: {brightness:.2f}, 对比度: {contrast:.2f}"
@@ -403,54 +1029,18 @@ def is_before_image(descriptions):
     before_count = 0
     after_count = 0
 
-    # 之前相关词汇
-    before_keywords = [
-        "before",
-        "messy",
-        "dirty",
-        "unsafe",
-        "hazard",
-        "violation",
-        "disorganized",
-        "cluttered",
-        "dangerous",
-        "risky",
-        "precarious",
-        "unstable",
-        "insecure",
-        "unprotected",
-        "unguarded",
-        "unshielded",
-    ]
-
-    # 之后相关词汇
-    after_keywords = [
-        "after",
-        "clean",
-        "tidy",
-        "safe",
-        "organized",
-        "neat",
-        "secure",
-        "stable",
-        "protected",
-        "guarded",
-        "shielded",
-        "improvement",
-    ]
-
     # 统计词汇出现次数
     for desc in descriptions:
         desc_lower = desc.lower()
 
         # 检查"之前"相关词汇
-        for keyword in before_keywords:
+        for keyword in BEFORE_KEYWORDS:
             if keyword in desc_lower:
                 before_count += 1
                 break
 
         # 检查"之后"相关词汇
-        for keyword in after_keywords:
+        for keyword in AFTER_KEYWORDS:
             if keyword in desc_lower:
                 after_count += 1
                 break
@@ -474,41 +1064,19 @@ def is_before_image(descriptions):
             return False
 
 
-def analyze_image_pair(image1_path, image2_path):
+def _decide_pair(image1_path, image2_path, image1_descriptions, image2_descriptions):
     """
-    分析一对图片，识别内容并判断哪个是"之前"图片，哪个是"之后"图片
+    根据两张图片的描述判断哪个是"之前"图片，哪个是"之后"图片
 
     Args:
         image1_path (str): 第一张图片路径
         image2_path (str): 第二张图片路径
+        image1_descriptions (list): 第一张图片的描述列表
+        image2_descriptions (list): 第二张图片的描述列表
 
     Returns:
         tuple: (before_image_path, after_image_path, content_description)
     """
-    # 获取CLIP Interrogator实例
-    interrogator = get_clip_interrogator()
-
-    # 识别图片内容
-    print(f"正在识别图片内容: {os.path.basename(image1_path)}")
-    if interrogator:
-        # 使用CLIP Interrogator
-        image1_descriptions = interrogator.interrogate(image1_path)
-
-        print(f"正在识别图片内容: {os.path.basename(image2_path)}")
-        image2_descriptions = interrogator.interrogate(image2_path)
-    else:
-        # 使用简化版图片分析
-        print("使用简化版图片分析...")
-        image1_descriptions = simple_image_analysis(image1_path)
-        print(
-            f"简化分析结果 ({os.path.basename(image1_path)}): {', '.join(image1_descriptions)}"
-        )
-
-        image2_descriptions = simple_image_analysis(image2_path)
-        print(
-            f"简化分析结果 ({os.path.basename(image2_path)}): {', '.join(image2_descriptions)}"
-        )
-
     # 判断哪个是"之前"图片，哪个是"之后"图片
     image1_is_before = is_before_image(image1_descriptions)
     image2_is_before = is_before_image(image2_descriptions)
@@ -540,6 +1108,473 @@ def analyze_image_pair(image1_path, image2_path):
     return (before_image_path, after_image_path, content_description)
 
 
+def _get_class_centroids(interrogator):
+    """
+    获取"之前"和"之后"两个类别的中心向量（各自描述集合文本向量的平均值，归一化）
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+
+    Returns:
+        torch.Tensor: 形状为 (2, dim) 的矩阵，第0行为"之前"，第1行为"之后"
+    """
+    centroids = _class_centroids.get(interrogator.model_name)
+    if centroids is None:
+        centroids = torch.stack(
+            [
+                load_text_features(interrogator, BEFORE_PROMPTS, "before").mean(dim=0),
+                load_text_features(interrogator, AFTER_PROMPTS, "after").mean(dim=0),
+            ]
+        )
+        centroids /= centroids.norm(dim=-1, keepdim=True)
+        _class_centroids[interrogator.model_name] = centroids
+    return centroids
+
+
+def get_probe_file(model_name):
+    """
+    获取线性探针的保存路径
+
+    Args:
+        model_name (str): CLIP模型名称
+
+    Returns:
+        str: 线性探针文件路径
+    """
+    return os.path.join(config.CLIP_EMBEDDING_CACHE_DIR, f"probe_{model_name}.npz")
+
+
+def load_linear_probe(interrogator):
+    """
+    读取用历史手动配对图片训练的线性探针
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+
+    Returns:
+        tuple: (weights, bias)，没有训练过探针或未启用时返回None
+    """
+    if not config.AI_PROBE_ENABLED:
+        return None
+
+    if interrogator.model_name not in _linear_probes:
+        probe = None
+        probe_file = get_probe_file(interrogator.model_name)
+        if os.path.exists(probe_file):
+            data = np.load(probe_file)
+            probe = (torch.from_numpy(data["weights"]), float(data["bias"]))
+            print(f"使用线性探针判断'之前/之后': {probe_file}")
+        _linear_probes[interrogator.model_name] = probe
+
+    return _linear_probes[interrogator.model_name]
+
+
+def before_scores(interrogator, image_features, use_probe=True):
+    """
+    计算图片属于"之前"图片的概率，一次矩阵运算处理整批图片
+
+    有线性探针时使用探针，否则使用图片向量与"之前/之后"两个中心向量的相似度
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+        image_features (torch.Tensor): 归一化后的图片向量矩阵
+        use_probe (bool): 是否使用训练好的线性探针
+
+    Returns:
+        numpy.ndarray: 每张图片是"之前"图片的概率（0-1）
+    """
+    probe = load_linear_probe(interrogator) if use_probe else None
+
+    with torch.inference_mode():
+        image_features = image_features.float()
+        if probe is not None:
+            weights, bias = probe
+            logits = image_features @ weights.to(image_features.device) + bias
+        else:
+            centroids = _get_class_centroids(interrogator).float().to(image_features.device)
+            similarity = 100.0 * image_features @ centroids.T
+            logits = similarity[:, 0] - similarity[:, 1]
+        return torch.sigmoid(logits).cpu().numpy()
+
+
+def _fit_logistic_regression(features, labels, epochs=500, learning_rate=0.5, l2=1e-3):
+    """
+    使用全批量梯度下降训练逻辑回归
+
+    Args:
+        features (numpy.ndarray): 特征矩阵，形状为 (n, dim)
+        labels (numpy.ndarray): 标签（0或1）
+        epochs (int): 迭代次数
+        learning_rate (float): 学习率
+        l2 (float): L2正则化系数
+
+    Returns:
+        tuple: (weights, bias)
+    """
+    weights = np.zeros(features.shape[1], dtype=np.float32)
+    bias = 0.0
+    for _ in range(epochs):
+        probabilities = 1.0 / (1.0 + np.exp(-(features @ weights + bias)))
+        error = probabilities - labels
+        weights -= learning_rate * (features.T @ error / len(labels) + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+    return weights, bias
+
+
+def train_linear_probe(images_dir=None, holdout=0.2):
+    """
+    使用手动模式的历史图片（images/before和images/after）训练"之前/之后"线性探针
+
+    Args:
+        images_dir (str, optional): 图片根目录，如果为None则使用配置中的目录
+        holdout (float): 用于验证准确率的样本比例
+
+    Returns:
+        str: 保存的线性探针文件路径，训练失败时返回None
+    """
+    if images_dir is None:
+        images_dir = config.IMAGES_DIR
+
+    interrogator = get_clip_interrogator()
+    if interrogator is None:
+        print("CLIP不可用，无法训练线性探针")
+        return None
+
+    samples = []
+    for sub_dir, label in (("before", 1.0), ("after", 0.0)):
+        directory = os.path.join(images_dir, sub_dir)
+        if not os.path.isdir(directory):
+            print(f"目录不存在: {directory}")
+            return None
+        samples += [
+            (path, label)
+            for path in image_processor.get_image_files(directory)
+            if not os.path.basename(path).startswith("watermarked_")
+        ]
+
+    labels = np.array([label for _, label in samples], dtype=np.float32)
+    if len(set(labels.tolist())) < 2:
+        print("训练线性探针需要同时有'之前'和'之后'图片")
+        return None
+
+    print(f"正在使用 {len(samples)} 张图片训练线性探针...")
+    features = interrogator.encode_images([path for path, _ in samples]).cpu().numpy()
+
+    # 去掉无法读取的图片
+    readable = features.any(axis=1)
+    features, labels = features[readable], labels[readable]
+
+    # 划分验证集，报告未参与训练的样本上的准确率
+    order = np.random.default_rng(0).permutation(len(labels))
+    holdout_count = int(len(labels) * holdout)
+    if holdout_count:
+        test, train = order[:holdout_count], order[holdout_count:]
+        weights, bias = _fit_logistic_regression(features[train], labels[train])
+        accuracy = np.mean(((features[test] @ weights + bias) > 0) == (labels[test] > 0.5))
+        print(f"验证集准确率: {accuracy:.1%} ({holdout_count} 张图片)")
+
+        centroid_scores = before_scores(
+            interrogator, torch.from_numpy(features[test]), use_probe=False
+        )
+        centroid_accuracy = np.mean((centroid_scores > 0.5) == (labels[test] > 0.5))
+        print(f"中心向量分类器在验证集上的准确率: {centroid_accuracy:.1%}")
+
+    # 使用全部样本训练最终的探针
+    weights, bias = _fit_logistic_regression(features, labels)
+    accuracy = np.mean(((features @ weights + bias) > 0) == (labels > 0.5))
+    print(f"训练集准确率: {accuracy:.1%}")
+
+    probe_file = get_probe_file(interrogator.model_name)
+    os.makedirs(os.path.dirname(probe_file), exist_ok=True)
+    np.savez(probe_file, weights=weights, bias=bias)
+    _linear_probes.pop(interrogator.model_name, None)
+    print(f"线性探针已保存: {probe_file}")
+    return probe_file
+
+
+def _cascade_fast_stage(image_pairs):
+    """
+    级联判断的快速阶段：使用小模型（或降采样图片的亮度统计）为每张图片打分，
+    两张图片得分差距大于阈值的图片对直接确定"之前/之后"，其余的交给主模型
+
+    Args:
+        image_pairs (list): 图片对列表，每个元素是一个元组 (image1_path, image2_path)
+
+    Returns:
+        tuple: (results, pending)，results为与image_pairs对应的分析结果（未确定的为None），
+               pending为需要交给主模型的图片对索引列表
+    """
+    results = [None] * len(image_pairs)
+    image_paths = list(dict.fromkeys(path for pair in image_pairs for path in pair))
+
+    fast_model = config.AI_CASCADE_FAST_MODEL
+    if fast_model == config.CLIP_MODEL:
+        print("级联判断的快速模型与主模型相同，全部使用主模型判断")
+        return results, list(range(len(image_pairs)))
+
+    interrogator = None
+    if fast_model != "stats":
+        interrogator = get_clip_interrogator(fast_model)
+
+    scores = {}
+    descriptions = {}
+    if interrogator is not None:
+        print(f"级联判断快速阶段: 使用 {fast_model} 识别 {len(image_paths)} 张图片")
+        features = interrogator.encode_images(image_paths)
+        readable = features.any(dim=-1).tolist()
+        for path, score, is_readable, desc in zip(
+            image_paths,
+            before_scores(interrogator, features),
+            readable,
+            interrogator.describe_features(features, config.AI_MAX_DESCRIPTIONS, image_paths),
+        ):
+            if is_readable:
+                scores[path] = float(score)
+                descriptions[path] = desc
+        threshold = config.AI_CASCADE_MARGIN
+    else:
+        # 快速阶段：较暗的图片更可能是"之前"图片（与简化版图片分析的判断一致）
+        print(f"级联判断快速阶段: 使用亮度统计分析 {len(image_paths)} 张图片")
+        for path in image_paths:
+            try:
+                brightness, _ = image_statistics(path)
+                scores[path] = -brightness / 255.0
+            except Exception as e:
+                print(f"图片分析出错 ({os.path.basename(path)}): {e}")
+        threshold = config.AI_CASCADE_STATS_MARGIN
+
+    pending = []
+    for i, (image1_path, image2_path) in enumerate(image_pairs):
+        score1 = scores.get(image1_path)
+        score2 = scores.get(image2_path)
+        if score1 is None or score2 is None or abs(score1 - score2) < threshold:
+            pending.append(i)
+            continue
+
+        if score1 >= score2:
+            before_image_path, after_image_path = image1_path, image2_path
+        else:
+            before_image_path, after_image_path = image2_path, image1_path
+
+        before_descriptions = descriptions.get(before_image_path) or simple_image_analysis(
+            before_image_path
+        )
+        results[i] = (
+            before_image_path,
+            after_image_path,
+            " ".join(before_descriptions[:2]),
+        )
+        print(
+            f"快速阶段确定: 之前图片={os.path.basename(before_image_path)}, "
+            f"之后图片={os.path.basename(after_image_path)} (得分差 {abs(score1 - score2):.3f})"
+        )
+
+    return results, pending
+
+
+def _print_cascade_stats(
+    image_pairs, pending, fast_seconds, main_load_seconds, main_seconds, main_preloaded=False
+):
+    """
+    打印级联判断的统计信息：交给主模型的图片对比例和估计节省的时间
+
+    快速阶段确定的图片之后的语义描述匹配也使用快速模型，不会再加载主模型
+
+    Args:
+        image_pairs (list): 全部图片对
+        pending (list): 交给主模型的图片对索引列表
+        fast_seconds (float): 快速阶段耗时（秒）
+        main_load_seconds (float): 主模型加载耗时（秒）
+        main_seconds (float): 主模型分析耗时（秒，不含加载）
+        main_preloaded (bool): 主模型是否在级联判断之前已经加载
+    """
+    pending_set = set(pending)
+    main_images = {path for i in pending for path in image_pairs[i]}
+    fast_images = {
+        path
+        for i, pair in enumerate(image_pairs)
+        if i not in pending_set
+        for path in pair
+    } - main_images
+
+    print("=" * 50)
+    print("级联判断统计")
+    print("=" * 50)
+    print(
+        f"交给主模型的图片对: {len(pending)}/{len(image_pairs)} "
+        f"({len(pending) / len(image_pairs):.1%})"
+    )
+    print(f"快速阶段耗时: {fast_seconds:.2f} 秒")
+
+    if main_images:
+        per_image = main_seconds / len(main_images)
+        saved = per_image * len(fast_images) - fast_seconds
+        print(f"主模型耗时: {main_seconds:.2f} 秒（加载 {main_load_seconds:.2f} 秒）")
+        print(f"估计节省时间: {saved:.2f} 秒（主模型每张图片 {per_image:.2f} 秒）")
+    elif main_preloaded:
+        print("所有图片对都在快速阶段确定，主模型已经提前加载（只节省主模型推理时间）")
+    else:
+        print("所有图片对都在快速阶段确定，主模型没有加载（节省全部主模型加载和推理时间）")
+    print("=" * 50)
+
+
+def analyze_image_pairs(image_pairs):
+    """
+    批量分析图片对，判断每对图片中哪个是"之前"图片，哪个是"之后"图片
+
+    启用级联判断时，先用快速阶段判断，只有得分差距不明显的图片对才交给主模型
+
+    Args:
+        image_pairs (list): 图片对列表，每个元素是一个元组 (image1_path, image2_path)
+
+    Returns:
+        list: 与image_pairs顺序一致的分析结果列表，
+              每个元素是一个元组 (before_image_path, after_image_path, content_description)
+    """
+    _decision_models.clear()
+    if not config.AI_CASCADE_ENABLED or not image_pairs:
+        return _analyze_with_main_model(image_pairs)
+
+    # 主模型在级联判断之前已经加载时，快速阶段节省不了加载时间
+    main_preloaded = config.CLIP_MODEL in _clip_interrogators
+
+    start_time = time.perf_counter()
+    results, pending = _cascade_fast_stage(image_pairs)
+    fast_seconds = time.perf_counter() - start_time
+
+    fast_model = None if config.AI_CASCADE_FAST_MODEL == "stats" else config.AI_CASCADE_FAST_MODEL
+    for result in results:
+        if result is not None:
+            _decision_models[result[0]] = fast_model
+
+    main_load_seconds = main_seconds = 0.0
+    if pending:
+        # 主模型只在有需要时加载，单独计时
+        start_time = time.perf_counter()
+        get_clip_interrogator()
+        main_load_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        main_results = _analyze_with_main_model([image_pairs[i] for i in pending])
+        main_seconds = time.perf_counter() - start_time
+
+        for i, result in zip(pending, main_results):
+            results[i] = result
+
+    _print_cascade_stats(
+        image_pairs, pending, fast_seconds, main_load_seconds, main_seconds, main_preloaded
+    )
+    return results
+
+
+def _analyze_with_main_model(image_pairs):
+    """
+    使用主模型（配置中的CLIP模型，不可用时使用简化版图片分析）批量分析图片对：
+    先分批识别所有图片的内容，再判断每对图片中的"之前"和"之后"图片
+
+    Args:
+        image_pairs (list): 图片对列表，每个元素是一个元组 (image1_path, image2_path)
+
+    Returns:
+        list: 与image_pairs顺序一致的分析结果列表，
+              每个元素是一个元组 (before_image_path, after_image_path, content_description)
+    """
+    # 获取CLIP Interrogator实例
+    interrogator = get_clip_interrogator()
+
+    # 所有候选图片（去重后保持顺序）
+    image_paths = list(dict.fromkeys(path for pair in image_pairs for path in pair))
+
+    if interrogator:
+        return _decide_pairs_with_clip(interrogator, image_pairs, image_paths)
+
+    # 使用简化版图片分析
+    print("使用简化版图片分析...")
+    descriptions = {}
+    for path in image_paths:
+        descriptions[path] = simple_image_analysis(path)
+        print(f"简化分析结果 ({os.path.basename(path)}): {', '.join(descriptions[path])}")
+
+    results = []
+    for image1_path, image2_path in image_pairs:
+        print(
+            f"正在分析图片对: {os.path.basename(image1_path)} 和 {os.path.basename(image2_path)}"
+        )
+        results.append(
+            _decide_pair(
+                image1_path,
+                image2_path,
+                descriptions[image1_path],
+                descriptions[image2_path],
+            )
+        )
+
+    return results
+
+
+def _decide_pairs_with_clip(interrogator, image_pairs, image_paths):
+    """
+    使用CLIP图片向量批量判断图片对：一次矩阵运算算出所有图片的"之前"得分，
+    每对图片中得分较高的为"之前"图片
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+        image_pairs (list): 图片对列表，每个元素是一个元组 (image1_path, image2_path)
+        image_paths (list): 所有候选图片（去重后）
+
+    Returns:
+        list: 与image_pairs顺序一致的分析结果列表，
+              每个元素是一个元组 (before_image_path, after_image_path, content_description)
+    """
+    print(f"正在识别 {len(image_paths)} 张图片的内容...")
+    try:
+        features = interrogator.encode_images(image_paths)
+        descriptions = interrogator.describe_features(
+            features, config.AI_MAX_DESCRIPTIONS, image_paths
+        )
+        scores = before_scores(interrogator, features)
+    except Exception as e:
+        print(f"图片识别出错: {e}")
+        descriptions = [["unknown content"] for _ in image_paths]
+        scores = np.zeros(len(image_paths))
+
+    positions = {path: i for i, path in enumerate(image_paths)}
+    first = np.array([positions[image1_path] for image1_path, _ in image_pairs], dtype=int)
+    second = np.array([positions[image2_path] for _, image2_path in image_pairs], dtype=int)
+    # 得分相同时（例如两张图片都无法读取）默认第一张为"之前"图片
+    first_is_before = scores[first] >= scores[second]
+
+    results = []
+    for (image1_path, image2_path), i, j, is_before in zip(
+        image_pairs, first, second, first_is_before
+    ):
+        if not is_before:
+            (image1_path, i), (image2_path, j) = (image2_path, j), (image1_path, i)
+        content_description = " ".join(descriptions[i][:2])
+        print(
+            f"之前图片={os.path.basename(image1_path)} (得分 {scores[i]:.2f}), "
+            f"之后图片={os.path.basename(image2_path)} (得分 {scores[j]:.2f})"
+        )
+        print(f"内容描述: {content_description}")
+        results.append((image1_path, image2_path, content_description))
+
+    return results
+
+
+def analyze_image_pair(image1_path, image2_path):
+    """
+    分析一对图片，识别内容并判断哪个是"之前"图片，哪个是"之后"图片
+
+    Args:
+        image1_path (str): 第一张图片路径
+        image2_path (str): 第二张图片路径
+
+    Returns:
+        tuple: (before_image_path, after_image_path, content_description)
+    """
+    return analyze_image_pairs([(image1_path, image2_path)])[0]
+
+
 def simple_description_match(content_description, descriptions_list):
     """
     简化版描述匹配，基于关键词匹配
@@ -644,26 +1679,231 @@ def simple_description_match(content_description, descriptions_list):
     return result
 
 
-def find_best_description_match(content_description, descriptions_list):
+def _get_catalog_features(interrogator, descriptions):
     """
-    根据图片内容描述，从Excel数据中找到最匹配的描述
+    获取CAPA描述的文本向量矩阵，同一份CAPA数据只计算一次（内存和磁盘缓存）
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+        descriptions (list): CAPA描述列表
+
+    Returns:
+        torch.Tensor: 归一化后的文本向量矩阵
+    """
+    global _catalog_features
+
+    if _catalog_features is None or _catalog_features[0] != tuple(descriptions):
+        _catalog_features = (tuple(descriptions), {})
+
+    # 级联判断时快速模型和主模型各自需要一份描述向量
+    features = _catalog_features[1]
+    key = (interrogator.model_name, interrogator.pretrained)
+    if key not in features:
+        features[key] = load_text_features(interrogator, descriptions, "capa")
+    return features[key]
+
+
+def semantic_description_matches(image_paths, descriptions_list, top_k=None):
+    """
+    语义描述匹配：用CLIP文本编码器计算所有CAPA描述的向量，与图片向量一次性计算相似度并取top-k
+
+    级联判断确定的图片使用确定它的模型（快速模型确定的图片不加载主模型），
+    亮度统计确定的图片不做语义匹配
+
+    Args:
+        image_paths (list): 图片路径列表（通常是每个图像对的"之前"图片）
+        descriptions_list (list): 描述列表，每个元素是一个元组 (描述, 纠正措施)
+        top_k (int, optional): 打印的候选数量，如果为None则使用配置中的数量
+
+    Returns:
+        list: 与image_paths顺序一致的 (描述, 纠正措施) 列表，无法读取的图片对应None；
+              CLIP不可用或没有可用的描述时返回None
+    """
+    if top_k is None:
+        top_k = config.CAPA_MATCH_TOP_K
+
+    if not image_paths or not _import_clip():
+        return None
+
+    descriptions = [str(desc) for desc, _ in descriptions_list]
+    # 过滤掉过短的描述（如只有"Before "这样的）
+    valid = torch.tensor([len(desc.strip()) >= 5 for desc in descriptions])
+    if not valid.any():
+        return None
+
+    # 按确定图片的模型分组
+    groups = {}
+    for row, image_path in enumerate(image_paths):
+        model_name = _decision_models.get(image_path, config.CLIP_MODEL)
+        groups.setdefault(model_name, []).append(row)
+
+    results = [None] * len(image_paths)
+    for model_name, rows in groups.items():
+        if model_name is None:
+            continue
+
+        interrogator = get_clip_interrogator(model_name)
+        if interrogator is None:
+            if model_name == config.CLIP_MODEL:
+                return None
+            continue
+
+        group_paths = [image_paths[row] for row in rows]
+        for row, match in zip(
+            rows,
+            _semantic_matches(interrogator, group_paths, descriptions_list, valid, top_k),
+        ):
+            results[row] = match
+
+    return results
+
+
+def _semantic_matches(interrogator, image_paths, descriptions_list, valid, top_k):
+    """
+    使用指定模型做语义描述匹配
+
+    Args:
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+        image_paths (list): 图片路径列表
+        descriptions_list (list): 描述列表，每个元素是一个元组 (描述, 纠正措施)
+        valid (torch.Tensor): 每条描述是否参与匹配
+        top_k (int): 打印的候选数量
+
+    Returns:
+        list: 与image_paths顺序一致的 (描述, 纠正措施) 列表，无法读取的图片对应None
+    """
+    descriptions = [str(desc) for desc, _ in descriptions_list]
+    catalog_features = _get_catalog_features(interrogator, descriptions)
+    image_features = interrogator.encode_images(image_paths).to(catalog_features.device)
+
+    with torch.inference_mode():
+        scores = image_features @ catalog_features.T
+        scores[:, ~valid.to(scores.device)] = -float("inf")
+        values, indices = scores.topk(min(top_k, int(valid.sum())), dim=-1)
+
+    results = []
+    for row, image_path in enumerate(image_paths):
+        # 无法读取的图片向量全为0
+        if not image_features[row].any():
+            results.append(None)
+            continue
+
+        print(f"语义匹配结果 ({os.path.basename(image_path)}):")
+        for i, (value, index) in enumerate(zip(values[row].tolist(), indices[row].tolist())):
+            print(f"  {i+1}. 描述: '{descriptions[index]}', 相似度: {value:.3f}")
+        results.append(descriptions_list[indices[row][0].item()])
+
+    return results
+
+
+def get_capa_index(descriptions_list):
+    """
+    获取CAPA描述的BM25倒排索引
+
+    Args:
+        descriptions_list (list): 描述列表，每个元素是一个元组 (描述, 纠正措施)
+
+    Returns:
+        CapaIndex: 索引
+    """
+    stopwords = get_stopwords() if config.CAPA_INDEX_STOPWORDS else None
+    return capa_index.get_index([str(desc) for desc, _ in descriptions_list], stopwords)
+
+
+def lexical_description_match(content_description, descriptions_list, top_k=None, index=None):
+    """
+    基于BM25倒排索引的关键词描述匹配
 
     Args:
         content_description (str): 图片内容描述
         descriptions_list (list): 描述列表，每个元素是一个元组 (描述, 纠正措施)
+        top_k (int, optional): 打印的候选数量，如果为None则使用配置中的数量
+        index (CapaIndex, optional): 已加载的索引，批量匹配时避免重复检查索引
 
     Returns:
-        tuple: (描述, 纠正措施)
+        tuple: (描述, 纠正措施)，没有任何描述包含查询词时返回None
+    """
+    if top_k is None:
+        top_k = config.CAPA_MATCH_TOP_K
+
+    if index is None:
+        index = get_capa_index(descriptions_list)
+
+    results = index.search(content_description, top_k)
+    if not results:
+        return None
+
+    print(f"关键词匹配结果 ('{content_description}'):")
+    for i, (doc, score) in enumerate(results):
+        print(f"  {i+1}. 描述: '{descriptions_list[doc][0]}', BM25分数: {score:.3f}")
+
+    return descriptions_list[results[0][0]]
+
+
+def find_best_description_matches(content_descriptions, descriptions_list, image_paths=None):
+    """
+    批量查找最匹配的描述。提供图片路径且CLIP可用时直接用图片向量做语义匹配，
+    否则根据图片内容描述在BM25索引中做关键词匹配，没有任何关键词命中时使用简化版描述匹配
+
+    Args:
+        content_descriptions (list): 图片内容描述列表
+        descriptions_list (list): 描述列表，每个元素是一个元组 (描述, 纠正措施)
+        image_paths (list, optional): 与content_descriptions对应的图片路径列表
+
+    Returns:
+        list: 与content_descriptions顺序一致的 (描述, 纠正措施) 列表
     """
     # 如果描述列表为空，则返回默认描述
     if not descriptions_list:
-        return ("无描述", "无纠正措施")
+        return [("无描述", "无纠正措施")] * len(content_descriptions)
+
+    matches = [None] * len(content_descriptions)
+    if image_paths and config.CAPA_SEMANTIC_MATCH:
+        try:
+            matches = semantic_description_matches(image_paths, descriptions_list) or matches
+        except Exception as e:
+            print(f"语义描述匹配出错: {e}")
+
+    results = []
+    index = None
+    for content_description, match in zip(content_descriptions, matches):
+        if match is None and config.CAPA_BM25_ENABLED:
+            try:
+                # 索引只在第一次需要时加载
+                if index is None:
+                    index = get_capa_index(descriptions_list)
+                match = lexical_description_match(
+                    content_description, descriptions_list, index=index
+                )
+            except Exception as e:
+                print(f"关键词描述匹配出错: {e}")
+
+        if match is None:
+            print("使用简化版描述匹配...")
+            match = simple_description_match(content_description, descriptions_list)
+        results.append(match)
+
+    return results
+
+
+def find_best_description_match(content_description, descriptions_list, image_path=None):
+    """
+    根据图片内容描述（或图片本身），从Excel数据中找到最匹配的描述
 
+    Args:
+        content_description (str): 图片内容描述
+        descriptions_list (list): 描述列表，每个元素是一个元组 (描述, 纠正措施)
+        image_path (str, optional): 图片路径，提供时优先使用语义匹配
+
+    Returns:
+        tuple: (描述, 纠正措施)
+    """
     try:
-        # 使用简化版描述匹配，因为CLIP模型需要图像输入
-        # 这里我们只有文本描述，没有图像，所以不能直接使用CLIP模型
-        print("使用简化版描述匹配...")
-        return simple_description_match(content_description, descriptions_list)
+        return find_best_description_matches(
+            [content_description],
+            descriptions_list,
+            [image_path] if image_path else None,
+        )[0]
 
     except Exception as e:
         print(f"描述匹配出错: {e}")
@@ -695,7 +1935,7 @@ def process_image_pair_with_ai(image1_path, image2_path, descriptions_list):
 
         # 找到最匹配的描述
         description, action = find_best_description_match(
-            content_description, descriptions_list
+            content_description, descriptions_list, before_image_path
         )
 
         # 确保描述不为空
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地AI推理服务，在后台进程中保持CLIP模型常驻，多次运行报告生成器时不需要重复导入和加载模型
+
+服务监听本机端口（默认127.0.0.1:50007），使用保存在缓存目录中的随机密钥认证连接。
+ai_processor获取CLIP Interrogator时会先尝试连接服务，服务未运行时在当前进程中加载模型。
+"""
+
+import os
+import threading
+from multiprocessing.connection import Listener, Client
+import numpy as np
+import config
+import ai_processor
+
+# 允许远程调用的ClipInterrogator方法
+REMOTE_METHODS = (
+    "encode_images",
+    "encode_texts",
+    "describe_features",
+    "interrogate_batch",
+    "interrogate",
+)
+
+# 参数中包含图片路径的方法（客户端转换为绝对路径，服务端的工作目录可能不同）
+PATH_METHODS = ("encode_images", "interrogate_batch", "interrogate")
+
+# 连接时同步给客户端的ClipInterrogator属性
+REMOTE_ATTRIBUTES = (
+    "model_name",
+    "pretrained",
+    "precision",
+    "device",
+    "image_size",
+    "prompts",
+    "text_features",
+)
+
+
+def _get_address():
+    """
+    获取服务地址
+
+    Returns:
+        tuple: (host, port)
+    """
+    return (config.AI_SERVER_HOST, config.AI_SERVER_PORT)
+
+
+def _load_authkey(create=False):
+    """
+    读取连接认证密钥
+
+    Args:
+        create (bool): 密钥文件不存在时是否创建
+
+    Returns:
+        bytes: 认证密钥，不存在且不创建时返回None
+    """
+    if os.path.exists(config.AI_SERVER_AUTHKEY_FILE):
+        with open(config.AI_SERVER_AUTHKEY_FILE, "rb") as f:
+            return f.read()
+
+    if not create:
+        return None
+
+    os.makedirs(os.path.dirname(config.AI_SERVER_AUTHKEY_FILE), exist_ok=True)
+    authkey = os.urandom(32)
+    # 只有当前用户可以读取密钥
+    fd = os.open(config.AI_SERVER_AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def _to_numpy(value):
+    """
+    将torch张量转换为numpy数组，便于在进程之间传输
+    """
+    if ai_processor.torch is not None and isinstance(value, ai_processor.torch.Tensor):
+        return value.detach().cpu().numpy()
+    return value
+
+
+def _to_tensor(value, device="cpu"):
+    """
+    将numpy数组转换为torch张量
+    """
+    if isinstance(value, np.ndarray) and ai_processor._import_clip():
+        return ai_processor.torch.from_numpy(value).to(device)
+    return value
+
+
+def _handle_connection(connection, interrogator, lock):
+    """
+    处理一个客户端连接上的所有请求
+
+    Args:
+        connection (multiprocessing.connection.Connection): 客户端连接
+        interrogator (ClipInterrogator): CLIP Interrogator实例
+        lock (threading.Lock): 模型推理锁，同一时间只处理一个请求
+    """
+    try:
+        while True:
+            try:
+                method, args, kwargs = connection.recv()
+            except EOFError:
+                break
+
+            if method == "__attributes__":
+                connection.send(
+                    (
+                        True,
+                        {name: _to_numpy(getattr(interrogator, name)) for name in REMOTE_ATTRIBUTES},
+                    )
+                )
+                continue
+
+            if method not in REMOTE_METHODS:
+                connection.send((False, f"不支持的方法: {method}"))
+                continue
+
+            try:
+                args = [_to_tensor(arg, interrogator.device) for arg in args]
+                with lock:
+                    result = getattr(interrogator, method)(*args, **kwargs)
+                connection.send((True, _to_numpy(result)))
+            except Exception as e:
+                connection.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+def serve():
+    """
+    启动本地AI推理服务（阻塞运行，按Ctrl+C停止）
+    """
+    if not ai_processor.CLIP_AVAILABLE:
+        print("CLIP库不可用，无法启动AI推理服务")
+        return
+
+    interrogator = ai_processor.ClipInterrogator()
+    lock = threading.Lock()
+    authkey = _load_authkey(create=True)
+
+    with Listener(_get_address(), authkey=authkey) as listener:
+        host, port = _get_address()
+        print(f"AI推理服务已启动: {host}:{port}（模型: {interrogator.model_name}, {interrogator.precision}）")
+        print("按Ctrl+C停止服务")
+
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"接受连接时出错: {e}")
+                    continue
+
+                thread = threading.Thread(
+                    target=_handle_connection,
+                    args=(connection, interrogator, lock),
+                    daemon=True,
+                )
+                thread.start()
+        except KeyboardInterrupt:
+            print("AI推理服务已停止")
+
+
+class RemoteInterrogator:
+    """AI推理服务的客户端，提供与ClipInterrogator相同的接口"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._lock = threading.Lock()
+        self._local = None
+
+        attributes = self._call("__attributes__")
+        for name, value in attributes.items():
+            setattr(self, name, _to_tensor(value) if name == "text_features" else value)
+
+    def _call(self, method, *args, **kwargs):
+        """
+        调用服务端的方法
+
+        Returns:
+            object: 方法的返回值
+        """
+        args = [_to_numpy(arg) for arg in args]
+        if method in PATH_METHODS and args:
+            if isinstance(args[0], str):
+                args[0] = os.path.abspath(args[0])
+            else:
+                args[0] = [os.path.abspath(path) for path in args[0]]
+
+        with self._lock:
+            self._connection.send((method, args, kwargs))
+            ok, result = self._connection.recv()
+
+        if not ok:
+            raise RuntimeError(f"AI推理服务调用失败: {result}")
+        return result
+
+    def _fallback(self):
+        """
+        服务中断时在当前进程中加载模型
+
+        Returns:
+            ClipInterrogator: 本地CLIP Interrogator实例
+        """
+        if self._local is None:
+            print("AI推理服务连接中断，将在当前进程中加载模型")
+            self._local = ai_processor.ClipInterrogator(
+                self.model_name, self.pretrained, self.precision
+            )
+        return self._local
+
+    def __getattr__(self, name):
+        if name not in REMOTE_METHODS:
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            if self._local is None:
+                try:
+                    return _to_tensor(self._call(name, *args, **kwargs))
+                except (EOFError, OSError):
+                    pass
+            return getattr(self._fallback(), name)(*args, **kwargs)
+
+        return method
+
+
+def connect(model_name=None):
+    """
+    连接本地AI推理服务
+
+    Args:
+        model_name (str, optional): 需要的CLIP模型名称，如果为None则使用配置中的模型
+
+    Returns:
+        RemoteInterrogator: 服务客户端，服务未运行或模型配置不一致时返回None
+    """
+    if model_name is None:
+        model_name = config.CLIP_MODEL
+
+    authkey = _load_authkey()
+    if authkey is None:
+        return None
+
+    try:
+        connection = Client(_get_address(), authkey=authkey)
+    except (OSError, EOFError):
+        return None
+
+    try:
+        interrogator = RemoteInterrogator(connection)
+    except Exception as e:
+        print(f"连接AI推理服务失败: {e}")
+        connection.close()
+        return None
+
+    # 服务使用的模型与当前配置不一致时不使用服务
+    if (interrogator.model_name, interrogator.precision) != (
+        model_name,
+        config.CLIP_PRECISION,
+    ):
+        print(
+            f"AI推理服务使用的模型 ({interrogator.model_name}, {interrogator.precision}) "
+            f"与当前配置不一致，将在当前进程中加载模型"
+        )
+        connection.close()
+        return None
+
+    print(f"使用AI推理服务: {config.AI_SERVER_HOST}:{config.AI_SERVER_PORT}")
+    return interrogator
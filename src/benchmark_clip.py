@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+CLIP模型性能测试，比较不同模型和推理精度的速度、内存占用和识别结果
+
+使用手动模式的before/after图像对作为带标签的样本集，每个模型（及推理精度）在单独的子进程中运行，
+分别统计模型加载时间、每秒处理的图片数、峰值内存，以及与参考模型（默认ViT-L-14的fp32结果）
+的描述一致率和"之前/之后"判断一致率。
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import contextlib
+
+# 添加当前目录到系统路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import image_processor
+import ai_processor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def parse_arguments():
+    """
+    解析命令行参数
+
+    Returns:
+        argparse.Namespace: 解析后的参数
+    """
+    parser = argparse.ArgumentParser(description="CLIP模型性能测试")
+
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        choices=config.CLIP_MODELS,
+        default=config.CLIP_MODELS,
+        help="要测试的CLIP模型",
+    )
+    parser.add_argument(
+        "--precisions",
+        nargs="+",
+        choices=config.CLIP_PRECISIONS,
+        default=["fp32"],
+        help="要测试的推理精度，例如 --precisions fp32 int8 bf16 验证降低精度后与fp32的一致率",
+    )
+    parser.add_argument(
+        "--reference",
+        choices=config.CLIP_MODELS,
+        default="ViT-L-14",
+        help="作为比较基准的参考模型（使用fp32精度）",
+    )
+    parser.add_argument(
+        "--images",
+        type=str,
+        default=config.IMAGES_DIR,
+        help="图片文件夹路径（使用其中before和after目录的手动配对图像作为样本）",
+    )
+    parser.add_argument("--limit", type=int, default=None, help="最多使用的图像对数量")
+    parser.add_argument(
+        "--batch-size", type=int, default=config.CLIP_BATCH_SIZE, help="CLIP图片编码的批大小"
+    )
+
+    # 子进程参数（内部使用）
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--precision", type=str, default="fp32", help=argparse.SUPPRESS)
+    parser.add_argument("--result", type=str, default=None, help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+def get_sample_pairs(images_dir, limit=None):
+    """
+    获取带标签的样本图像对
+
+    Args:
+        images_dir (str): 图片文件夹路径
+        limit (int, optional): 最多使用的图像对数量
+
+    Returns:
+        list: 图像对列表，每个元素是一个元组 (before_image_path, after_image_path)
+    """
+    image_pairs = image_processor.get_manual_image_pairs(images_dir) or []
+    pairs = [(before, after) for before, after, _, _ in image_pairs]
+    return pairs[:limit] if limit else pairs
+
+
+def get_peak_memory_mb():
+    """
+    获取当前进程的峰值内存占用
+
+    Returns:
+        float: 峰值内存（MB），无法获取时返回None
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux返回KB，macOS返回字节
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def run_model(model_name, precision, pairs, batch_size):
+    """
+    使用指定模型识别所有样本图片（在子进程中运行）
+
+    Args:
+        model_name (str): CLIP模型名称
+        precision (str): 推理精度
+        pairs (list): 样本图像对列表
+        batch_size (int): CLIP图片编码的批大小
+
+    Returns:
+        dict: 测试结果
+    """
+    # 不使用向量存储，测量实际的编码速度
+    config.CLIP_EMBEDDING_STORE_ENABLED = False
+
+    start_time = time.perf_counter()
+    interrogator = ai_processor.ClipInterrogator(model_name, precision=precision)
+    load_seconds = time.perf_counter() - start_time
+
+    image_paths = [path for pair in pairs for path in pair]
+
+    # 识别过程中的逐张输出对比较结果没有意义，不打印
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        features = interrogator.encode_images(image_paths, batch_size)
+        encode_seconds = time.perf_counter() - start_time
+
+        descriptions = interrogator.describe_features(
+            features, config.AI_MAX_DESCRIPTIONS, image_paths
+        )
+        scores = ai_processor.before_scores(interrogator, features)
+        order_correct = [
+            bool(scores[2 * i] >= scores[2 * i + 1]) for i in range(len(pairs))
+        ]
+
+    return {
+        "model": model_name,
+        "precision": interrogator.precision,
+        "load_seconds": load_seconds,
+        "images_per_second": len(image_paths) / encode_seconds if encode_seconds else None,
+        "peak_memory_mb": get_peak_memory_mb(),
+        "top_descriptions": [desc[0] for desc in descriptions],
+        "top_k_descriptions": descriptions,
+        "order_correct": order_correct,
+    }
+
+
+def run_model_subprocess(model_name, precision, args):
+    """
+    在单独的子进程中测试模型，使每个模型的峰值内存互不影响
+
+    Args:
+        model_name (str): CLIP模型名称
+        precision (str): 推理精度
+        args (argparse.Namespace): 命令行参数
+
+    Returns:
+        dict: 测试结果，失败时返回None
+    """
+    fd, result_file = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--worker",
+        model_name,
+        "--precision",
+        precision,
+        "--result",
+        result_file,
+        "--images",
+        args.images,
+        "--batch-size",
+        str(args.batch_size),
+    ]
+    if args.limit:
+        command += ["--limit", str(args.limit)]
+
+    try:
+        print(f"正在测试模型 {model_name} ({precision})...")
+        completed = subprocess.run(command)
+        if completed.returncode != 0:
+            print(f"测试模型 {model_name} ({precision}) 失败")
+            return None
+
+        with open(result_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    finally:
+        os.remove(result_file)
+
+
+def agreement(values, reference_values):
+    """
+    计算两组结果的一致率
+
+    Returns:
+        float: 一致率（0-1）
+    """
+    if not reference_values:
+        return 0.0
+    same = sum(1 for value, reference in zip(values, reference_values) if value == reference)
+    return same / len(reference_values)
+
+
+def top_k_agreement(descriptions, reference_descriptions):
+    """
+    计算两组top-k描述的平均重合率
+
+    Returns:
+        float: 重合率（0-1）
+    """
+    if not reference_descriptions:
+        return 0.0
+    overlaps = [
+        len(set(top_k) & set(reference)) / max(len(reference), 1)
+        for top_k, reference in zip(descriptions, reference_descriptions)
+    ]
+    return sum(overlaps) / len(reference_descriptions)
+
+
+def print_results(results, reference):
+    """
+    打印测试结果
+
+    Args:
+        results (dict): "模型/精度"到测试结果的映射
+        reference (str): 参考结果的名称（"模型/fp32"）
+    """
+    reference_result = results.get(reference)
+
+    print("=" * 110)
+    print("CLIP模型性能测试结果")
+    print("=" * 110)
+    print(
+        f"{'模型':<16} {'加载(秒)':>9} {'图片/秒':>9} {'峰值内存(MB)':>13} "
+        f"{'判断准确率':>10} {'描述一致率':>10} {'top-k重合率':>11} {'判断一致率':>10}"
+    )
+
+    for name, result in results.items():
+        peak_memory = result["peak_memory_mb"]
+        accuracy = sum(result["order_correct"]) / len(result["order_correct"])
+
+        if reference_result:
+            description_agreement = (
+                f"{agreement(result['top_descriptions'], reference_result['top_descriptions']):.1%}"
+            )
+            top_k_overlap = (
+                f"{top_k_agreement(result['top_k_descriptions'], reference_result['top_k_descriptions']):.1%}"
+            )
+            order_agreement = (
+                f"{agreement(result['order_correct'], reference_result['order_correct']):.1%}"
+            )
+        else:
+            description_agreement = top_k_overlap = order_agreement = "-"
+
+        print(
+            f"{name:<16} {result['load_seconds']:>9.1f} "
+            f"{result['images_per_second'] or 0:>9.2f} "
+            f"{peak_memory if peak_memory is not None else 0:>13.0f} "
+            f"{accuracy:>10.1%} {description_agreement:>10} {top_k_overlap:>11} "
+            f"{order_agreement:>10}"
+        )
+
+    print("=" * 110)
+    if reference_result is None:
+        print(f"参考模型 {reference} 没有测试结果，无法计算一致率")
+
+
+def main():
+    """
+    主函数
+    """
+    args = parse_arguments()
+    pairs = get_sample_pairs(args.images, args.limit)
+
+    # 子进程：测试单个模型并写入结果文件
+    if args.worker:
+        result = run_model(args.worker, args.precision, pairs, args.batch_size)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    if not pairs:
+        print("没有找到样本图像对，请在images/before和images/after目录中放入手动配对的图片")
+        return
+
+    if not ai_processor.CLIP_AVAILABLE:
+        print("CLIP库不可用，无法进行测试")
+        return
+
+    print(f"样本图像对数量: {len(pairs)}")
+
+    runs = [(model, precision) for model in args.models for precision in args.precisions]
+    if (args.reference, "fp32") not in runs:
+        runs.append((args.reference, "fp32"))
+
+    results = {}
+    for model_name, precision in runs:
+        result = run_model_subprocess(model_name, precision, args)
+        if result:
+            # CPU不支持时实际精度可能回退为fp32
+            results[f"{model_name}/{result['precision']}"] = result
+
+    if results:
+        print_results(results, f"{args.reference}/fp32")
+
+
+if __name__ == "__main__":
+    main()
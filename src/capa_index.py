@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+CAPA描述的BM25倒排索引，用于在大型CAPA库中按关键词查找最匹配的描述
+
+索引在加载CAPA数据后构建一次，查询时只访问包含查询词的描述（倒排表），
+耗时与CAPA库的总行数无关。索引保存在CAPA CSV文件旁边，描述内容没有变化时直接读取。
+"""
+
+import os
+import re
+import json
+import math
+import heapq
+import hashlib
+from collections import Counter, defaultdict
+import config
+
+# 索引格式版本，分词或评分方式变化时递增
+INDEX_VERSION = 1
+
+# BM25参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 过短的描述（如只有"Before "这样的）不加入索引
+MIN_DESCRIPTION_LENGTH = 5
+
+# 英文单词和数字按词切分，中文按字切分
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+
+# 当前加载的索引
+_index = None
+
+
+def tokenize(text, stopwords=None):
+    """
+    将文本切分为词
+
+    Args:
+        text (str): 文本
+        stopwords (set, optional): 停用词集合
+
+    Returns:
+        list: 词列表
+    """
+    tokens = _TOKEN_PATTERN.findall(str(text).lower())
+    if stopwords:
+        tokens = [token for token in tokens if token not in stopwords]
+    return tokens
+
+
+def descriptions_hash(descriptions, stopwords=None):
+    """
+    计算描述列表（及分词参数）的哈希值，用于判断保存的索引是否可用
+
+    Returns:
+        str: 十六进制哈希字符串
+    """
+    payload = json.dumps(
+        {
+            "version": INDEX_VERSION,
+            "k1": BM25_K1,
+            "b": BM25_B,
+            "stopwords": sorted(stopwords) if stopwords else [],
+            "descriptions": descriptions,
+        },
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CapaIndex:
+    """CAPA描述的BM25倒排索引"""
+
+    def __init__(self, postings, doc_lengths, stopwords=None, key=None):
+        """
+        Args:
+            postings (dict): 词到倒排表的映射，倒排表为 [(描述索引, 词频), ...]
+            doc_lengths (dict): 描述索引到词数的映射
+            stopwords (set, optional): 停用词集合
+            key (str, optional): 描述列表的哈希值
+        """
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.stopwords = stopwords
+        self.key = key
+
+        count = len(doc_lengths)
+        self.average_length = sum(doc_lengths.values()) / count if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, descriptions, stopwords=None):
+        """
+        构建索引
+
+        Args:
+            descriptions (list): 描述文本列表
+            stopwords (set, optional): 停用词集合
+
+        Returns:
+            CapaIndex: 索引
+        """
+        postings = defaultdict(list)
+        doc_lengths = {}
+
+        for i, description in enumerate(descriptions):
+            if len(str(description).strip()) < MIN_DESCRIPTION_LENGTH:
+                continue
+
+            tokens = tokenize(description, stopwords)
+            doc_lengths[i] = len(tokens)
+            for term, frequency in Counter(tokens).items():
+                postings[term].append((i, frequency))
+
+        return cls(dict(postings), doc_lengths, stopwords, descriptions_hash(descriptions, stopwords))
+
+    def search(self, query, top_k=3):
+        """
+        查询与文本最匹配的描述
+
+        Args:
+            query (str): 查询文本
+            top_k (int): 返回的结果数量
+
+        Returns:
+            list: 元组 (描述索引, BM25分数) 列表，按分数从高到低排序
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query, self.stopwords)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+
+            idf = self.idf[term]
+            for doc, frequency in docs:
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc] / (
+                    self.average_length or 1.0
+                )
+                scores[doc] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def save(self, index_file):
+        """
+        保存索引（先写入临时文件再重命名）
+
+        Args:
+            index_file (str): 索引文件路径
+        """
+        data = {
+            "key": self.key,
+            "stopwords": sorted(self.stopwords) if self.stopwords else [],
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        temp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_file, index_file)
+
+    @classmethod
+    def load(cls, index_file):
+        """
+        读取保存的索引
+
+        Args:
+            index_file (str): 索引文件路径
+
+        Returns:
+            CapaIndex: 索引
+        """
+        with open(index_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        # JSON的键只能是字符串，倒排表中的元组被保存为列表
+        postings = {
+            term: [(doc, frequency) for doc, frequency in docs]
+            for term, docs in data["postings"].items()
+        }
+        doc_lengths = {int(doc): length for doc, length in data["doc_lengths"].items()}
+        return cls(postings, doc_lengths, set(data["stopwords"]) or None, data["key"])
+
+
+def get_index_file(csv_path=None):
+    """
+    获取索引文件路径（保存在CAPA CSV文件旁边）
+
+    Args:
+        csv_path (str, optional): CAPA CSV文件路径，如果为None则使用配置中的路径
+
+    Returns:
+        str: 索引文件路径
+    """
+    if csv_path is None:
+        csv_path = config.CAPA_CSV_FILE
+    return os.path.splitext(csv_path)[0] + ".bm25.json"
+
+
+def get_index(descriptions, stopwords=None, csv_path=None):
+    """
+    获取CAPA描述的索引：优先使用已加载的索引，其次读取CSV旁边保存的索引，都不可用时重新构建
+
+    Args:
+        descriptions (list): 描述文本列表
+        stopwords (set, optional): 停用词集合
+        csv_path (str, optional): CAPA CSV文件路径，如果为None则使用配置中的路径
+
+    Returns:
+        CapaIndex: 索引
+    """
+    global _index
+
+    key = descriptions_hash(descriptions, stopwords)
+    if _index is not None and _index.key == key:
+        return _index
+
+    index_file = get_index_file(csv_path)
+    if os.path.exists(index_file):
+        try:
+            index = CapaIndex.load(index_file)
+            if index.key == key:
+                _index = index
+                return _index
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取CAPA索引出错，将重新构建: {e}")
+
+    _index = CapaIndex.build(descriptions, stopwords)
+    print(f"已构建CAPA索引: {len(_index.doc_lengths)} 条描述，{len(_index.postings)} 个词")
+
+    try:
+        _index.save(index_file)
+    except OSError as e:
+        print(f"保存CAPA索引失败: {e}")
+
+    return _index
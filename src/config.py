@@ -38,15 +38,75 @@ IMAGE_RESIZE_ENABLED = True  # 是否启用图像大小调整
 IMAGE_MAX_WIDTH = 1200  # 图像最大宽度
 IMAGE_MAX_HEIGHT = 800  # 图像最大高度
 IMAGE_QUALITY = 90  # 图像质量（1-100）
+IMAGE_OUTPUT_FORMAT = "auto"  # 输出格式："auto"照片类PNG转为JPEG，"jpeg"全部转为JPEG，"source"保持源格式
+IMAGE_JPEG_OPTIMIZE = False  # JPEG优化编码（文件更小，编码更慢）
+IMAGE_JPEG_PROGRESSIVE = False  # JPEG渐进式编码
+IMAGE_PNG_COMPRESS_LEVEL = 1  # PNG压缩级别（0-9），级别越高文件越小，编码越慢
+IMAGE_MAX_PIXELS = 200_000_000  # 允许打开的最大像素数，超过则视为解压炸弹并跳过
+IMAGE_STRIP_METADATA = True  # 保存时去掉EXIF、注释等元数据（保留颜色配置文件）
+IMAGE_IN_MEMORY = False  # 是否将处理后的图像保存在内存中直接写入报告（不生成watermarked_文件）
+IMAGE_WORKERS = 1  # 并行处理图像对的进程数量，1表示顺序处理
+
+# 去重配置
+DEDUP_ENABLED = False  # 自动模式下是否检测近似重复的图像
+DEDUP_MODE = "flag"  # "flag"只提示重复的图像，"collapse"每组只保留第一张
+DEDUP_HAMMING_THRESHOLD = 6  # 感知哈希（64位）的汉明距离阈值，不超过该值视为近似重复
+
+# 缓存配置
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")  # 缓存根目录
+IMAGE_CACHE_ENABLED = True  # 是否缓存添加水印和调整大小后的图像（水印使用随机日期时间的图像不缓存）
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")  # 图像缓存目录
+IMAGE_CACHE_MAX_MB = 2048  # 图像缓存大小上限（MB），超过后按LRU淘汰
+CLIP_EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "clip")  # CLIP向量缓存目录
+CLIP_EMBEDDING_STORE_ENABLED = True  # 是否按图片内容哈希保存CLIP图片向量，内容不变的图片不再重新编码
+CLIP_MODEL_CACHE_ENABLED = True  # 是否将CLIP模型保存到本地缓存，之后使用内存映射快速加载（可离线运行）
+CLIP_MODEL_CACHE_DIR = os.path.join(CACHE_DIR, "models")  # CLIP本地模型缓存目录
+IMAGE_MANIFEST_ENABLED = True  # 是否使用图像清单记录目录扫描结果
+IMAGE_MANIFEST_FILE = os.path.join(CACHE_DIR, "manifest.sqlite")  # 图像清单文件路径
 
 # 报告配置
 REPORT_TITLE = "Daily Report"
 REPORT_AUTHOR = "System"
+REPORT_IMAGE_WIDTH_INCHES = 3.0  # 报告中每张图片的显示宽度（英寸）
+REPORT_IMAGE_DPI = None  # 图片的打印分辨率（如150或220），设置后按显示宽度计算所需像素并缩小图片
 
 # AI配置
 USE_AI = True  # 是否使用AI识别图片内容
 AI_CONFIDENCE_THRESHOLD = 0.7  # AI识别的置信度阈值
 AI_MAX_DESCRIPTIONS = 3  # 每张图片最多返回的描述数量
+CLIP_MODEL = "ViT-L-14"  # CLIP模型：ViT-B-32（最快）、ViT-B-16、ViT-L-14（最准确）
+CLIP_PRETRAINED = "openai"  # CLIP预训练权重名称
+CLIP_MODELS = ["ViT-B-32", "ViT-B-16", "ViT-L-14"]  # 可选的CLIP模型
+CLIP_PRECISION = "fp32"  # 图像编码器的推理精度：fp32、int8（线性层动态量化）、bf16（需要CPU支持）
+CLIP_PRECISIONS = ["fp32", "int8", "bf16"]  # 可选的推理精度
+CLIP_NUM_THREADS = None  # CLIP推理使用的线程数，None表示使用torch的默认值
+CLIP_BATCH_SIZE = 16  # CLIP图片编码的批大小
+CLIP_PREFETCH_THREADS = 2  # 解码和预处理图片的后台线程数，0表示在推理线程中依次解码
+CLIP_PREFETCH_QUEUE_SIZE = None  # 预处理好的图片队列容量，None表示批大小的2倍
+AI_WORKERS = 1  # 并行编码图片的进程数，工作进程由加载模型的进程fork产生并共享模型权重（仅Linux/macOS）
+AI_CASCADE_ENABLED = False  # 是否使用级联判断：快速阶段能确定的图片对不再交给主模型
+AI_CASCADE_FAST_MODEL = "ViT-B-32"  # 级联判断快速阶段使用的模型，"stats"表示使用降采样图片的亮度统计
+AI_CASCADE_MARGIN = 0.2  # 快速模型的"之前"得分差距（0-1）大于该值时直接确定
+AI_PROBE_ENABLED = True  # 是否使用训练好的线性探针判断"之前/之后"（需要先运行 --train-probe，没有探针时使用描述中心向量）
+AI_PAIRING_MODE = "sequential"  # 自动模式的配对方式："sequential"按修改时间相邻两两配对，"assignment"按内容相似度和拍摄时间全局匹配
+AI_PAIRING_MIN_SIMILARITY = 0.6  # 配对的两张图片向量的最低余弦相似度，低于该值视为未配对
+AI_PAIRING_TIME_WEIGHT = 0.2  # 拍摄时间差在配对代价中的权重
+AI_PAIRING_TIME_WINDOW_HOURS = 72  # 拍摄时间差的惩罚在该时间（小时）内线性增加，超过后不再增加
+AI_CASCADE_STATS_MARGIN = 0.15  # 亮度统计的亮度差距（0-1）大于该值时直接确定
+CAPA_SEMANTIC_MATCH = True  # 是否用CLIP将图片与CAPA描述直接做语义匹配（CLIP不可用时使用关键词匹配）
+CAPA_BM25_ENABLED = True  # 是否使用BM25倒排索引做关键词描述匹配（索引保存在CAPA CSV文件旁边）
+CAPA_INDEX_STOPWORDS = True  # 建立索引时是否去除英文停用词（需要nltk）
+CAPA_MATCH_TOP_K = 3  # 描述匹配时打印的候选描述数量
+AI_ANALYSIS_IMAGE_SIZE = 256  # 简化版图片分析时的解码尺寸（像素）
+CLIP_PROMPTS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "clip_prompts.txt"
+)  # CLIP Interrogator使用的描述词表文件
+
+# AI推理服务配置
+AI_SERVER_ENABLED = True  # 是否优先使用常驻的本地AI推理服务（服务未运行时在当前进程中加载模型）
+AI_SERVER_HOST = "127.0.0.1"  # AI推理服务监听地址（只监听本机）
+AI_SERVER_PORT = 50007  # AI推理服务端口
+AI_SERVER_AUTHKEY_FILE = os.path.join(CACHE_DIR, "ai_server.key")  # AI推理服务的连接认证密钥文件
 
 # 输入配置
 USE_INPUT_CSV = True  # 是否使用input.csv文件中的数据
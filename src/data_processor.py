@@ -96,8 +96,11 @@ def read_input_csv_data(csv_path=None):
                         # 成功解析日期后，添加随机工作时间
                         if date_obj:
                             # 生成随机工作时间（与config.py相同的逻辑）
-                            random_hour = random.randint(8, 17)
-                            random_minute = random.randint(0, 59)
+                            # 以编号和日期作为随机种子，重复运行时水印时间保持不变，
+                            # 这样未修改的图像可以直接使用图像缓存
+                            rng = random.Random(f"{no}|{date_str}")
+                            random_hour = rng.randint(8, 17)
+                            random_minute = rng.randint(0, 59)
                             date_obj = date_obj.replace(
                                 hour=random_hour,
                                 minute=random_minute,
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片向量存储模块，将CLIP图片向量持久化保存在磁盘上
+
+每个模型对应一个float16矩阵文件（按行追加，读取时使用内存映射）和一个索引文件，
+索引文件记录图片内容哈希到矩阵行号的映射。同一张图片（内容不变）再次分析时直接读取向量，
+不需要重新运行CLIP图像编码器，描述识别、"之前/之后"判断和描述匹配都可以从保存的向量重新计算。
+
+同时运行的多个报告生成器可能共用同一个存储，读取索引、追加向量和保存索引都在文件锁内完成，
+行号按追加时矩阵文件的实际长度计算。
+"""
+
+import os
+import re
+import json
+import contextlib
+import numpy as np
+import config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows没有fcntl，不加锁（不支持多个进程同时写入同一个存储）
+    fcntl = None
+
+
+class EmbeddingStore:
+    """按图片内容哈希保存向量的存储，每个模型（及精度）一个实例"""
+
+    def __init__(self, model_key, dim, store_dir=None):
+        """
+        Args:
+            model_key (str): 模型标识，如"ViT-L-14_openai"，不同模型的向量分开保存
+            dim (int): 向量维度
+            store_dir (str, optional): 存储目录，如果为None则使用配置中的CLIP向量缓存目录
+        """
+        if store_dir is None:
+            store_dir = config.CLIP_EMBEDDING_CACHE_DIR
+
+        file_key = re.sub(r"[^A-Za-z0-9_.-]", "_", model_key)
+        self.dim = dim
+        self.model_key = model_key
+        self.data_file = os.path.join(store_dir, f"images_{file_key}.f16")
+        self.index_file = os.path.join(store_dir, f"images_{file_key}.json")
+        self.lock_file = os.path.join(store_dir, f"images_{file_key}.lock")
+        self.row_bytes = dim * np.dtype(np.float16).itemsize
+        self.rows = {}
+        self._matrix = None
+
+        os.makedirs(store_dir, exist_ok=True)
+        with self._lock():
+            self._load_index()
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        获取存储的排他文件锁（进程之间互斥）
+        """
+        with open(self.lock_file, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        """
+        读取索引文件，并丢弃矩阵文件中没有索引的行（上次写入中断时产生），需要在文件锁内调用
+        """
+        rows = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("model") == self.model_key and index.get("dim") == self.dim:
+                    rows = index.get("rows", {})
+                else:
+                    print(f"向量存储索引与当前模型不匹配，将重新建立: {self.index_file}")
+            except (OSError, ValueError) as e:
+                print(f"读取向量存储索引出错，将重新建立: {e}")
+
+        expected_size = len(rows) * self.row_bytes
+        if not os.path.exists(self.data_file) or os.path.getsize(self.data_file) < expected_size:
+            # 矩阵文件缺失或不完整，索引不可信
+            rows = {}
+            expected_size = 0
+        with open(self.data_file, "ab") as f:
+            f.truncate(expected_size)
+
+        self.rows = rows
+
+    def _save_index(self):
+        """
+        保存索引文件（先写入临时文件再重命名），需要在文件锁内调用
+        """
+        temp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_key, "dim": self.dim, "rows": self.rows}, f)
+        os.replace(temp_file, self.index_file)
+
+    def _get_matrix(self):
+        """
+        获取向量矩阵的内存映射
+
+        Returns:
+            numpy.memmap: 形状为 (行数, dim) 的只读float16矩阵，没有数据时返回None
+        """
+        if not self.rows:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != len(self.rows):
+            self._matrix = np.memmap(
+                self.data_file, dtype=np.float16, mode="r", shape=(len(self.rows), self.dim)
+            )
+        return self._matrix
+
+    def get(self, keys):
+        """
+        读取已保存的向量
+
+        Args:
+            keys (list): 图片内容哈希列表
+
+        Returns:
+            dict: 已保存的图片内容哈希到向量（float32数组）的映射，未保存的哈希不包含在内
+        """
+        matrix = self._get_matrix()
+        if matrix is None:
+            return {}
+
+        found = [key for key in dict.fromkeys(keys) if key in self.rows]
+        if not found:
+            return {}
+
+        vectors = np.asarray(matrix[[self.rows[key] for key in found]], dtype=np.float32)
+        return dict(zip(found, vectors))
+
+    def put(self, vectors):
+        """
+        追加保存向量，已保存的哈希会被跳过
+
+        在文件锁内重新读取索引（其他进程可能已经追加了向量），行号按追加位置计算
+
+        Args:
+            vectors (dict): 图片内容哈希到向量的映射
+        """
+        if not any(key not in self.rows for key in vectors):
+            return
+
+        with self._lock():
+            self._load_index()
+            self._matrix = None
+
+            new_items = [(key, vector) for key, vector in vectors.items() if key not in self.rows]
+            if not new_items:
+                return
+
+            data = np.stack([np.asarray(vector, dtype=np.float16) for _, vector in new_items])
+            if data.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: {data.shape[1]} != {self.dim}")
+
+            with open(self.data_file, "ab") as f:
+                first_row = f.tell() // self.row_bytes
+                f.write(data.tobytes())
+            for i, (key, _) in enumerate(new_items):
+                self.rows[key] = first_row + i
+
+            self._save_index()
+
+    def __len__(self):
+        return len(self.rows)
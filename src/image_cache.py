@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图像缓存模块，按内容缓存添加水印和调整大小后的图像
+
+缓存键由源文件内容的哈希值和所有影响输出结果的参数（水印文本、字体、
+最大尺寸、图像质量、目标尺寸等）组成，源图像和参数都没有变化时直接使用缓存结果。
+缓存索引保存在SQLite数据库中，超过容量上限时按最近最少使用（LRU）顺序淘汰。
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import config
+
+# 缓存格式版本，图像处理逻辑变化时递增，使旧缓存失效
+CACHE_VERSION = 4
+
+# 数据库连接（按进程保存，避免在进程池的子进程中复用父进程的连接）
+_connection = None
+_connection_pid = None
+
+
+def file_hash(file_path, chunk_size=1024 * 1024):
+    """
+    计算文件内容的SHA-256哈希值
+
+    Args:
+        file_path (str): 文件路径
+        chunk_size (int): 每次读取的字节数
+
+    Returns:
+        str: 十六进制哈希字符串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_params():
+    """
+    获取所有影响处理结果的配置参数
+
+    Returns:
+        dict: 参数字典
+    """
+    return {
+        "version": CACHE_VERSION,
+        "font": config.WATERMARK_FONT,
+        "font_size": config.WATERMARK_FONT_SIZE,
+        "text_color": list(config.WATERMARK_TEXT_COLOR),
+        "outline_color": list(config.WATERMARK_OUTLINE_COLOR),
+        "position": config.WATERMARK_POSITION,
+        "padding": config.WATERMARK_PADDING,
+        "resize_enabled": config.IMAGE_RESIZE_ENABLED,
+        "max_width": config.IMAGE_MAX_WIDTH,
+        "max_height": config.IMAGE_MAX_HEIGHT,
+        "quality": config.IMAGE_QUALITY,
+        "dpi": config.REPORT_IMAGE_DPI,
+        "print_width": config.REPORT_IMAGE_WIDTH_INCHES,
+        "strip_metadata": config.IMAGE_STRIP_METADATA,
+        "output_format": config.IMAGE_OUTPUT_FORMAT,
+        "jpeg_optimize": config.IMAGE_JPEG_OPTIMIZE,
+        "jpeg_progressive": config.IMAGE_JPEG_PROGRESSIVE,
+        "png_compress_level": config.IMAGE_PNG_COMPRESS_LEVEL,
+    }
+
+
+def cache_key(image_path, target_size, datetime_str):
+    """
+    计算处理后图像的缓存键
+
+    Args:
+        image_path (str): 源图像路径
+        target_size (tuple): 目标尺寸 (width, height)
+        datetime_str (str): 水印文本
+
+    Returns:
+        str: 缓存键
+    """
+    params = _cache_params()
+    params["source"] = file_hash(image_path)
+    params["extension"] = os.path.splitext(image_path)[1].lower()
+    params["target_size"] = list(target_size)
+    params["watermark"] = datetime_str
+
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _get_connection():
+    """
+    获取缓存索引数据库连接，不存在时创建数据库和表
+
+    Returns:
+        sqlite3.Connection: 数据库连接
+    """
+    global _connection, _connection_pid
+
+    if _connection is None or _connection_pid != os.getpid():
+        os.makedirs(config.IMAGE_CACHE_DIR, exist_ok=True)
+        _connection = sqlite3.connect(
+            os.path.join(config.IMAGE_CACHE_DIR, "index.sqlite"), timeout=30
+        )
+        _connection_pid = os.getpid()
+        with _connection:
+            _connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, file TEXT, size INTEGER, last_access REAL)"
+            )
+            _connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+
+    return _connection
+
+
+def _record(name):
+    """
+    累加命中/未命中计数
+    """
+    connection = _get_connection()
+    with connection:
+        connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+
+def fetch(key, output):
+    """
+    从缓存中获取处理后的图像，复制到输出路径或写入输出文件对象
+
+    Args:
+        key (str): 缓存键
+        output (str or file): 输出路径，或者可写入的文件对象（如io.BytesIO）
+
+    Returns:
+        str or file: 命中时返回output，未命中时返回None
+    """
+    try:
+        connection = _get_connection()
+        row = connection.execute(
+            "SELECT file FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+
+        cached_file = os.path.join(config.IMAGE_CACHE_DIR, row[0]) if row else None
+        if cached_file is None or not os.path.exists(cached_file):
+            _record("misses")
+            return None
+
+        if isinstance(output, str):
+            shutil.copyfile(cached_file, output)
+        else:
+            with open(cached_file, "rb") as f:
+                shutil.copyfileobj(f, output)
+
+        # 更新最近访问时间，用于LRU淘汰
+        with connection:
+            connection.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        _record("hits")
+        return output
+
+    except Exception as e:
+        print(f"读取图像缓存时出错: {e}")
+        return None
+
+
+def store(key, processed, extension=None):
+    """
+    将处理后的图像保存到缓存中
+
+    Args:
+        key (str): 缓存键
+        processed (str or io.BytesIO): 处理后的图像路径，或者包含编码后图像数据的缓冲区
+        extension (str, optional): 图像扩展名，如果为None则从processed路径中获取
+    """
+    try:
+        connection = _get_connection()
+        if extension is None:
+            extension = os.path.splitext(processed)[1]
+        file_name = key + extension.lower()
+        cached_file = os.path.join(config.IMAGE_CACHE_DIR, file_name)
+
+        # 先写入临时文件再重命名，避免其他进程读到不完整的文件
+        temp_file = f"{cached_file}.{os.getpid()}.tmp"
+        if isinstance(processed, str):
+            shutil.copyfile(processed, temp_file)
+        else:
+            with open(temp_file, "wb") as f:
+                f.write(processed.getvalue())
+        os.replace(temp_file, cached_file)
+
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, file, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, file_name, os.path.getsize(cached_file), time.time()),
+            )
+
+        evict()
+
+    except Exception as e:
+        print(f"写入图像缓存时出错: {e}")
+
+
+def evict(max_bytes=None):
+    """
+    当缓存总大小超过上限时，按最近最少使用顺序删除缓存文件
+
+    Args:
+        max_bytes (int, optional): 缓存大小上限（字节），如果为None则使用配置中的上限
+    """
+    if max_bytes is None:
+        max_bytes = config.IMAGE_CACHE_MAX_MB * 1024 * 1024
+
+    connection = _get_connection()
+    total_size = connection.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM entries"
+    ).fetchone()[0]
+    if total_size <= max_bytes:
+        return
+
+    rows = connection.execute(
+        "SELECT key, file, size FROM entries ORDER BY last_access ASC"
+    ).fetchall()
+    with connection:
+        for key, file_name, size in rows:
+            if total_size <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(config.IMAGE_CACHE_DIR, file_name))
+            except FileNotFoundError:
+                pass
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total_size -= size
+
+
+def get_stats():
+    """
+    获取缓存统计信息
+
+    Returns:
+        dict: 包含entries、size、hits、misses的统计信息
+    """
+    connection = _get_connection()
+    entries, size = connection.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+    ).fetchone()
+    stats = dict(connection.execute("SELECT name, value FROM stats").fetchall())
+
+    return {
+        "entries": entries,
+        "size": size,
+        "hits": stats.get("hits", 0),
+        "misses": stats.get("misses", 0),
+    }
+
+
+def print_stats():
+    """
+    打印缓存统计信息
+    """
+    stats = get_stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+
+    print("=" * 50)
+    print("图像缓存统计")
+    print("=" * 50)
+    print(f"缓存目录: {config.IMAGE_CACHE_DIR}")
+    print(f"缓存条目: {stats['entries']}")
+    print(
+        f"缓存大小: {stats['size'] / 1024 / 1024:.1f} MB / {config.IMAGE_CACHE_MAX_MB} MB"
+    )
+    print(f"命中次数: {stats['hits']}")
+    print(f"未命中次数: {stats['misses']}")
+    print(f"命中率: {hit_rate:.1f}%")
+    print("=" * 50)
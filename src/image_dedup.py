@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图像去重模块，使用感知哈希检测连拍、重复上传等近似重复的图像
+
+每张图像从小尺寸缩略图计算64位差值哈希（dHash），哈希值保存在图像清单中，
+图像没有变化时不需要重新计算。哈希值存入BK树，按汉明距离阈值查询近邻，
+避免对所有图像两两比较。
+"""
+
+import os
+from PIL import Image
+import config
+import image_processor
+import image_manifest
+
+# 差值哈希的尺寸，哈希位数为HASH_SIZE * HASH_SIZE
+HASH_SIZE = 8
+
+
+def dhash(image_path, hash_size=HASH_SIZE):
+    """
+    计算图像的差值哈希（dHash）
+
+    Args:
+        image_path (str): 图像路径
+        hash_size (int): 哈希尺寸
+
+    Returns:
+        int: 哈希值
+    """
+    # JPEG图像直接降采样解码，只需要很小的缩略图
+    image = image_processor.load_image(image_path, (hash_size * 8, hash_size * 8))
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(thumbnail.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(hash1, hash2):
+    """
+    计算两个哈希值的汉明距离
+    """
+    return (hash1 ^ hash2).bit_count()
+
+
+class BKTree:
+    """BK树，按汉明距离索引哈希值，支持阈值范围内的近邻查询"""
+
+    def __init__(self):
+        # 每个节点为 [哈希值, 条目列表, {距离: 子节点}]
+        self.root = None
+
+    def add(self, value, item):
+        """
+        添加哈希值
+
+        Args:
+            value (int): 哈希值
+            item: 与哈希值关联的条目
+        """
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def query(self, value, threshold):
+        """
+        查询与哈希值距离不超过阈值的所有条目
+
+        Args:
+            value (int): 哈希值
+            threshold (int): 汉明距离阈值
+
+        Returns:
+            list: 条目列表
+        """
+        results = []
+        if self.root is None:
+            return results
+
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= threshold:
+                results.extend(items)
+
+            # 根据三角不等式，只有距离在[distance - threshold, distance + threshold]内的子树可能包含结果
+            for child_distance, child in children.items():
+                if distance - threshold <= child_distance <= distance + threshold:
+                    stack.append(child)
+
+        return results
+
+
+def compute_hashes(image_files):
+    """
+    计算图像的感知哈希，启用图像清单时优先使用清单中保存的哈希值
+
+    Args:
+        image_files (list): 图像路径列表
+
+    Returns:
+        dict: 图像路径到哈希值的映射，无法读取的图像不包含在结果中
+    """
+    hashes = {}
+
+    if config.IMAGE_MANIFEST_ENABLED:
+        directories = {os.path.dirname(os.path.abspath(path)) for path in image_files}
+        for directory in directories:
+            for entry in image_manifest.scan_directory(directory, revalidate=True):
+                if entry.phash is not None:
+                    hashes[entry.path] = entry.phash
+
+    computed = {}
+    for path in image_files:
+        key = os.path.abspath(path) if config.IMAGE_MANIFEST_ENABLED else path
+        if key in hashes:
+            hashes[path] = hashes[key]
+            continue
+        try:
+            computed[key] = hashes[path] = dhash(path)
+        except Exception as e:
+            print(f"计算感知哈希时出错 ({os.path.basename(path)}): {e}")
+
+    if computed and config.IMAGE_MANIFEST_ENABLED:
+        image_manifest.update_phash(computed)
+
+    print(f"感知哈希: 共 {len(image_files)} 张图像，新计算 {len(computed)} 张")
+    return {path: hashes[path] for path in image_files if path in hashes}
+
+
+def find_duplicate_groups(image_files, threshold=None):
+    """
+    查找近似重复的图像组
+
+    Args:
+        image_files (list): 图像路径列表
+        threshold (int, optional): 汉明距离阈值，如果为None则使用配置中的阈值
+
+    Returns:
+        list: 重复组列表，每组是按image_files顺序排列的图像路径列表（至少两张）
+    """
+    if threshold is None:
+        threshold = config.DEDUP_HAMMING_THRESHOLD
+
+    hashes = compute_hashes(image_files)
+    order = {path: i for i, path in enumerate(image_files)}
+
+    # 并查集，将距离在阈值内的图像合并到同一组
+    parent = {path: path for path in hashes}
+
+    def find(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    tree = BKTree()
+    for path in image_files:
+        if path not in hashes:
+            continue
+        for other in tree.query(hashes[path], threshold):
+            root1, root2 = find(path), find(other)
+            if root1 != root2:
+                # 保留顺序靠前的图像作为组的代表
+                if order[root1] < order[root2]:
+                    parent[root2] = root1
+                else:
+                    parent[root1] = root2
+        tree.add(hashes[path], path)
+
+    groups = {}
+    for path in hashes:
+        groups.setdefault(find(path), []).append(path)
+
+    return [
+        sorted(group, key=order.get) for group in groups.values() if len(group) > 1
+    ]
+
+
+def deduplicate(image_files, mode=None, threshold=None):
+    """
+    检测近似重复的图像，按模式标记或合并
+
+    Args:
+        image_files (list): 图像路径列表
+        mode (str, optional): "flag"只打印重复组，"collapse"每组只保留第一张图像，
+                              如果为None则使用配置中的模式
+        threshold (int, optional): 汉明距离阈值，如果为None则使用配置中的阈值
+
+    Returns:
+        list: 处理后的图像路径列表（保持原有顺序）
+    """
+    if mode is None:
+        mode = config.DEDUP_MODE
+
+    groups = find_duplicate_groups(image_files, threshold)
+    if not groups:
+        print("未发现近似重复的图像")
+        return image_files
+
+    print(f"发现 {len(groups)} 组近似重复的图像:")
+    removed = set()
+    for group in groups:
+        duplicates = ", ".join(os.path.basename(path) for path in group[1:])
+        print(f"  保留 {os.path.basename(group[0])}，重复: {duplicates}")
+        removed.update(group[1:])
+
+    if mode != "collapse":
+        return image_files
+
+    print(f"合并近似重复的图像，移除 {len(removed)} 张")
+    return [path for path in image_files if path not in removed]
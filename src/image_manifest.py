@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图像清单模块，将图像目录的扫描结果保存在SQLite数据库中，后续运行只处理发生变化的部分
+
+每个文件记录大小、修改时间、像素尺寸、EXIF拍摄时间、从文件名解析出的
+pairing_id/capa_index以及感知哈希值（去重时计算）。目录的修改时间没有变化时不再列出目录，
+文件名直接使用清单中的记录；需要文件属性（修改时间、EXIF拍摄时间、尺寸、感知哈希）时逐个核对
+文件的大小和修改时间（原地覆盖的文件不会改变目录的修改时间）。有变化时只重新读取大小或修改时间
+变化的文件的图像头。
+"""
+
+import os
+import re
+import time
+import sqlite3
+from collections import namedtuple
+from PIL import Image
+import config
+
+# 支持的图像扩展名
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# 手动模式的文件命名规则：before目录为<pairing_id>_<capa_index>.jpg，after目录为<pairing_id>.jpg
+BEFORE_PATTERN = re.compile(r"^(\d+)_(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
+AFTER_PATTERN = re.compile(r"^(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
+
+# 目录修改时间距当前时间小于该值（秒）时不信任目录修改时间，避免同一时间刻度内的变化被漏掉
+_DIR_MTIME_SAFETY_WINDOW = 2.0
+
+# EXIF标签：Exif IFD、拍摄时间、修改时间
+_EXIF_IFD = 0x8769
+_EXIF_DATETIME_ORIGINAL = 36867
+_EXIF_DATETIME = 306
+
+ImageEntry = namedtuple(
+    "ImageEntry",
+    [
+        "path",
+        "size",
+        "mtime",
+        "width",
+        "height",
+        "exif_time",
+        "pairing_id",
+        "capa_index",
+        "phash",
+    ],
+)
+
+# 数据库连接（按进程保存）
+_connection = None
+_connection_pid = None
+
+
+def _get_connection():
+    """
+    获取清单数据库连接，不存在时创建数据库和表
+
+    Returns:
+        sqlite3.Connection: 数据库连接
+    """
+    global _connection, _connection_pid
+
+    if _connection is None or _connection_pid != os.getpid():
+        os.makedirs(os.path.dirname(config.IMAGE_MANIFEST_FILE), exist_ok=True)
+        _connection = sqlite3.connect(config.IMAGE_MANIFEST_FILE, timeout=30)
+        _connection_pid = os.getpid()
+        with _connection:
+            _connection.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER)"
+            )
+            _connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime_ns INTEGER, "
+                "width INTEGER, height INTEGER, exif_time TEXT, "
+                "pairing_id INTEGER, capa_index INTEGER, phash TEXT)"
+            )
+            # 旧版本的清单没有phash列
+            columns = [row[1] for row in _connection.execute("PRAGMA table_info(files)")]
+            if "phash" not in columns:
+                _connection.execute("ALTER TABLE files ADD COLUMN phash TEXT")
+            _connection.execute(
+                "CREATE INDEX IF NOT EXISTS files_dir ON files (dir)"
+            )
+
+    return _connection
+
+
+def _parse_name(file_name):
+    """
+    从文件名中解析pairing_id和capa_index
+
+    Args:
+        file_name (str): 文件名
+
+    Returns:
+        tuple: (pairing_id, capa_index)，不符合命名规则时为None
+    """
+    match = BEFORE_PATTERN.match(file_name)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+
+    match = AFTER_PATTERN.match(file_name)
+    if match:
+        return int(match.group(1)), None
+
+    return None, None
+
+
+def read_image_header(file_path):
+    """
+    读取图像头中的像素尺寸和EXIF拍摄时间（不解码像素数据）
+
+    Args:
+        file_path (str): 图像路径
+
+    Returns:
+        tuple: (width, height, exif_time)，exif_time格式为YYYY-MM-DD HH:MM:SS
+    """
+    try:
+        with Image.open(file_path) as image:
+            width, height = image.size
+            exif = image.getexif()
+            exif_time = exif.get_ifd(_EXIF_IFD).get(_EXIF_DATETIME_ORIGINAL) or exif.get(
+                _EXIF_DATETIME
+            )
+
+        if exif_time:
+            # EXIF时间格式为YYYY:MM:DD HH:MM:SS
+            exif_time = str(exif_time).strip("\x00 ")
+            exif_time = exif_time[:10].replace(":", "-") + exif_time[10:]
+
+        return width, height, exif_time or None
+
+    except Exception as e:
+        print(f"读取图像头信息时出错 ({os.path.basename(file_path)}): {e}")
+        return None, None, None
+
+
+def _rows_to_entries(rows):
+    """
+    将数据库记录转换为ImageEntry列表
+    """
+    return [
+        ImageEntry(
+            path=path,
+            size=size,
+            mtime=mtime_ns / 1e9,
+            width=width,
+            height=height,
+            exif_time=exif_time,
+            pairing_id=pairing_id,
+            capa_index=capa_index,
+            phash=int(phash, 16) if phash else None,
+        )
+        for (
+            path,
+            size,
+            mtime_ns,
+            width,
+            height,
+            exif_time,
+            pairing_id,
+            capa_index,
+            phash,
+        ) in rows
+    ]
+
+
+def _is_unchanged(path, size, mtime_ns):
+    """
+    检查文件的大小和修改时间是否与清单中的记录一致
+
+    Returns:
+        bool: 是否一致，文件不存在时返回False
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns)
+
+
+def scan_directory(directory, revalidate=False):
+    """
+    扫描目录中的图像文件（不包含子目录），返回清单记录
+
+    Args:
+        directory (str): 目录路径
+        revalidate (bool): 目录修改时间没有变化时，是否仍然逐个核对文件的大小和修改时间。
+            只需要文件名的调用（如手动模式配对）不需要核对；读取修改时间、EXIF拍摄时间、
+            尺寸或感知哈希的调用需要核对，原地覆盖的文件不会改变目录的修改时间
+
+    Returns:
+        list: ImageEntry列表，按文件名排序，目录不存在时返回空列表
+    """
+    directory = os.path.abspath(directory)
+    if not os.path.isdir(directory):
+        return []
+
+    connection = _get_connection()
+    select = (
+        "SELECT path, size, mtime_ns, width, height, exif_time, pairing_id, "
+        "capa_index, phash FROM files WHERE dir = ? ORDER BY path"
+    )
+
+    dir_mtime_ns = os.stat(directory).st_mtime_ns
+    row = connection.execute(
+        "SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)
+    ).fetchone()
+
+    # 目录修改时间没有变化，说明没有新增、删除或重命名文件，不需要列出目录；
+    # 原地覆盖文件（如重新裁剪或导出）不会改变目录修改时间，需要文件属性时逐个核对文件的大小和修改时间
+    if (
+        row is not None
+        and row[0] == dir_mtime_ns
+        and time.time() - dir_mtime_ns / 1e9 > _DIR_MTIME_SAFETY_WINDOW
+    ):
+        rows = connection.execute(select, (directory,)).fetchall()
+        if not revalidate or all(
+            _is_unchanged(path, size, mtime_ns) for path, size, mtime_ns, *_ in rows
+        ):
+            return _rows_to_entries(rows)
+
+    known = {
+        path: (size, mtime_ns)
+        for path, size, mtime_ns in connection.execute(
+            "SELECT path, size, mtime_ns FROM files WHERE dir = ?", (directory,)
+        )
+    }
+
+    seen = set()
+    updated = 0
+    with connection:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.name.lower().endswith(
+                    IMAGE_EXTENSIONS
+                ):
+                    continue
+                if not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                seen.add(entry.path)
+
+                # 大小和修改时间都没有变化的文件不需要重新读取图像头
+                if known.get(entry.path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                width, height, exif_time = read_image_header(entry.path)
+                pairing_id, capa_index = _parse_name(entry.name)
+                connection.execute(
+                    "INSERT OR REPLACE INTO files (path, dir, size, mtime_ns, width, "
+                    "height, exif_time, pairing_id, capa_index) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry.path,
+                        directory,
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                        width,
+                        height,
+                        exif_time,
+                        pairing_id,
+                        capa_index,
+                    ),
+                )
+                updated += 1
+
+        # 删除已经不存在的文件
+        removed = [path for path in known if path not in seen]
+        connection.executemany(
+            "DELETE FROM files WHERE path = ?", [(path,) for path in removed]
+        )
+
+        connection.execute(
+            "INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)",
+            (directory, dir_mtime_ns),
+        )
+
+    if updated or removed:
+        print(
+            f"图像清单已更新 ({directory}): 更新 {updated} 个文件，移除 {len(removed)} 个文件"
+        )
+
+    return _rows_to_entries(connection.execute(select, (directory,)).fetchall())
+
+
+def update_phash(hashes):
+    """
+    保存图像的感知哈希值，文件变化后重新扫描时会被清除
+
+    Args:
+        hashes (dict): 图像路径到感知哈希值（整数）的映射
+    """
+    connection = _get_connection()
+    with connection:
+        connection.executemany(
+            "UPDATE files SET phash = ? WHERE path = ?",
+            [(f"{value:016x}", path) for path, value in hashes.items()],
+        )
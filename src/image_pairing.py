@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自动模式的图像配对模块，按图像内容和拍摄时间在全局范围内为"之前"图片匹配"之后"图片
+
+所有图片先用CLIP编码（向量保存在向量存储中，再次运行时不需要重新编码），按"之前"得分排序，
+得分较高的一半为"之前"图片，其余为"之后"图片（零样本得分没有经过校准，不使用固定阈值）。
+两组图片的向量一次矩阵运算得到相似度矩阵，加上拍摄时间差的惩罚作为代价，
+求解代价最小的一一匹配（指派问题）。缺少一张照片只会使一张图片无法配对，不会影响其他图片对。
+相似度低于阈值的匹配视为未配对。
+"""
+
+import os
+from datetime import datetime
+import numpy as np
+import config
+import ai_processor
+import image_manifest
+
+
+def capture_times(image_files):
+    """
+    获取图像的拍摄时间：优先使用EXIF拍摄时间，没有时使用文件修改时间
+
+    Args:
+        image_files (list): 图像路径列表
+
+    Returns:
+        numpy.ndarray: 拍摄时间（Unix时间戳，秒）
+    """
+    exif_times = {}
+    mtimes = {}
+    if config.IMAGE_MANIFEST_ENABLED:
+        directories = {os.path.dirname(os.path.abspath(path)) for path in image_files}
+        for directory in directories:
+            for entry in image_manifest.scan_directory(directory, revalidate=True):
+                exif_times[entry.path] = entry.exif_time
+                mtimes[entry.path] = entry.mtime
+    else:
+        # 没有图像清单时直接读取图像头中的EXIF拍摄时间（不解码像素数据）
+        for path in image_files:
+            exif_times[os.path.abspath(path)] = image_manifest.read_image_header(path)[2]
+
+    times = []
+    for path in image_files:
+        key = os.path.abspath(path)
+        exif_time = exif_times.get(key)
+        if exif_time:
+            try:
+                times.append(datetime.strptime(exif_time, "%Y-%m-%d %H:%M:%S").timestamp())
+                continue
+            except ValueError:
+                pass
+        times.append(mtimes[key] if key in mtimes else os.path.getmtime(path))
+
+    return np.array(times, dtype=np.float64)
+
+
+def cost_matrix(before_features, after_features, before_times, after_times):
+    """
+    计算"之前"图片与"之后"图片两两配对的相似度和代价
+
+    代价为 (1 - 余弦相似度) 加上拍摄时间差的惩罚，时间差超过AI_PAIRING_TIME_WINDOW_HOURS时惩罚不再增加
+
+    Args:
+        before_features (numpy.ndarray): "之前"图片的归一化向量，形状为 (n, dim)
+        after_features (numpy.ndarray): "之后"图片的归一化向量，形状为 (m, dim)
+        before_times (numpy.ndarray): "之前"图片的拍摄时间
+        after_times (numpy.ndarray): "之后"图片的拍摄时间
+
+    Returns:
+        tuple: (similarity, cost)，均为形状为 (n, m) 的矩阵
+    """
+    similarity = before_features @ after_features.T
+
+    hours = np.abs(after_times[None, :] - before_times[:, None]) / 3600.0
+    time_penalty = np.minimum(hours / config.AI_PAIRING_TIME_WINDOW_HOURS, 1.0)
+
+    cost = (1.0 - similarity) + config.AI_PAIRING_TIME_WEIGHT * time_penalty
+    return similarity, cost
+
+
+def _hungarian(cost):
+    """
+    使用匈牙利算法（最短增广路径）求解代价最小的指派，每次增广的内层运算按列向量化
+
+    Args:
+        cost (numpy.ndarray): 代价矩阵，形状为 (n, m)，要求 n <= m
+
+    Returns:
+        tuple: (row_indices, col_indices)，按行号排序
+    """
+    n, m = cost.shape
+    # 势函数和匹配关系，下标从1开始，第0列为虚拟列
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)  # 每列匹配的行（0表示未匹配）
+    way = np.zeros(m + 1, dtype=int)
+
+    for row in range(1, n + 1):
+        match[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[col] = True
+            current_row = match[col]
+            free = ~used[1:]
+
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            improved = free & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = col
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[match[used_cols]] += delta
+            v[used_cols] -= delta
+            min_slack[1:][free] -= delta
+
+            col = next_col
+            if match[col] == 0:
+                break
+
+        # 沿增广路径更新匹配
+        while col:
+            previous = way[col]
+            match[col] = match[previous]
+            col = previous
+
+    cols = np.flatnonzero(match[1:]) + 1
+    rows = match[cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order] - 1
+
+
+def solve_assignment(cost):
+    """
+    求解代价最小的指派，行列数量不同时数量较多的一侧会有图片未被指派
+
+    安装了scipy时使用scipy.optimize.linear_sum_assignment（只在需要时导入），否则使用numpy实现的匈牙利算法
+
+    Args:
+        cost (numpy.ndarray): 代价矩阵，形状为 (n, m)
+
+    Returns:
+        tuple: (row_indices, col_indices)
+    """
+    if cost.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        linear_sum_assignment = None
+
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = _hungarian(cost.T)
+        return rows, cols
+    return _hungarian(cost)
+
+
+def pair_images(image_files, interrogator=None):
+    """
+    为自动模式的图片配对：按"之前"得分的排序分组，求解"之前"和"之后"图片之间代价最小的一一匹配
+
+    每对图片中"之前"图片的得分都不低于"之后"图片，与逐对判断（ai_processor.analyze_image_pairs）的结果一致
+
+    Args:
+        image_files (list): 图像路径列表
+        interrogator (ClipInterrogator, optional): CLIP Interrogator实例，如果为None则使用主模型
+
+    Returns:
+        tuple: (pairs, unpaired)，pairs为图像对列表，每个元素是一个元组
+               (before_image_path, after_image_path, content_description)，按"之前"图片在image_files中的顺序排列；
+               unpaired为未配对的图像路径列表
+    """
+    if interrogator is None:
+        interrogator = ai_processor.get_clip_interrogator()
+
+    print(f"正在为 {len(image_files)} 张图片计算配对...")
+    image_features = interrogator.encode_images(image_files)
+    scores = ai_processor.before_scores(interrogator, image_features)
+    features = image_features.float().cpu().numpy()
+
+    # 按得分从高到低排序，前一半为"之前"图片；图片数量为奇数时，中间的图片按得分是否达到0.5分组
+    readable = np.flatnonzero(features.any(axis=1))
+    ranked = readable[np.argsort(-scores[readable], kind="stable")]
+    before_count = len(ranked) // 2
+    if len(ranked) % 2 and scores[ranked[before_count]] >= 0.5:
+        before_count += 1
+    before_indices = np.sort(ranked[:before_count])
+    after_indices = np.sort(ranked[before_count:])
+
+    times = capture_times(image_files)
+    similarity, cost = cost_matrix(
+        features[before_indices],
+        features[after_indices],
+        times[before_indices],
+        times[after_indices],
+    )
+    rows, cols = solve_assignment(cost)
+
+    pairs = []
+    paired = set()
+    for row, col in zip(rows, cols):
+        before_index, after_index = before_indices[row], after_indices[col]
+        if similarity[row, col] < config.AI_PAIRING_MIN_SIMILARITY:
+            print(
+                f"相似度过低，不配对: {os.path.basename(image_files[before_index])} 和 "
+                f"{os.path.basename(image_files[after_index])} (相似度 {similarity[row, col]:.2f})"
+            )
+            continue
+        pairs.append((before_index, after_index))
+        paired.update((before_index, after_index))
+
+    pairs.sort()
+    unpaired = [path for i, path in enumerate(image_files) if i not in paired]
+
+    print(
+        f"图片配对完成: '之前'图片 {len(before_indices)} 张，'之后'图片 {len(after_indices)} 张，"
+        f"配对 {len(pairs)} 对，未配对 {len(unpaired)} 张"
+    )
+    for path in unpaired:
+        print(f"  未配对: {os.path.basename(path)}")
+
+    if not pairs:
+        return [], unpaired
+
+    # 内容描述使用"之前"图片的识别结果（与逐对判断相同）
+    before_paths = [image_files[i] for i, _ in pairs]
+    descriptions = interrogator.describe_features(
+        image_features[[i for i, _ in pairs]], config.AI_MAX_DESCRIPTIONS, before_paths
+    )
+    return [
+        (image_files[i], image_files[j], " ".join(description[:2]))
+        for (i, j), description in zip(pairs, descriptions)
+    ], unpaired
@@ -6,11 +6,339 @@
 """
 
 import os
-import re
+import io
+import glob
 import random
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont, ImageColor
 import config
+import image_cache
+import image_manifest
+
+# 像素数限制由open_image按IMAGE_MAX_PIXELS检查，关闭Pillow自带的检查（其默认限制低于配置，且只发出警告）
+Image.MAX_IMAGE_PIXELS = None
+
+
+def open_image(image_path):
+    """
+    打开图像（只读取图像头，不解码像素数据），像素数超过IMAGE_MAX_PIXELS的图像视为解压炸弹并拒绝打开
+
+    在读取图像头之后直接比较像素数，不依赖警告过滤器（警告过滤器不是线程安全的，预取线程中会失效）
+
+    Args:
+        image_path (str): 图像路径
+
+    Returns:
+        PIL.Image.Image: 图像对象
+
+    Raises:
+        Image.DecompressionBombError: 图像像素数超过限制
+    """
+    image = Image.open(image_path)
+    pixels = image.width * image.height
+    if config.IMAGE_MAX_PIXELS and pixels > config.IMAGE_MAX_PIXELS:
+        image.close()
+        raise Image.DecompressionBombError(
+            f"图像像素数 ({pixels}) 超过限制 ({config.IMAGE_MAX_PIXELS})，可能是解压炸弹: {image_path}"
+        )
+    return image
+
+
+def draft_image(image, target_size):
+    """
+    对JPEG图像启用降采样解码（draft模式），解码后的尺寸不小于目标尺寸
+
+    JPEG可以在解码时按1/2、1/4、1/8缩小，大尺寸照片解码时间和内存占用都会成倍减少。
+    必须在图像解码之前调用，对其他格式的图像没有影响
+
+    Args:
+        image (PIL.Image.Image): 已打开但尚未解码的图像对象
+        target_size (tuple): 目标尺寸 (width, height)
+
+    Returns:
+        PIL.Image.Image: 图像对象
+    """
+    if image.format == "JPEG" and (
+        image.width > target_size[0] and image.height > target_size[1]
+    ):
+        image.draft(image.mode, tuple(target_size))
+
+    return image
+
+
+def load_image(image_path, min_size=None):
+    """
+    加载RGB图像，如果指定了最小尺寸，JPEG图像会降采样解码到接近该尺寸
+
+    Args:
+        image_path (str): 图像路径
+        min_size (tuple, optional): 解码后图像的最小尺寸 (width, height)
+
+    Returns:
+        PIL.Image.Image: 已解码的RGB图像
+    """
+    with open_image(image_path) as image:
+        if min_size is not None:
+            draft_image(image, min_size)
+        return image.convert("RGB")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(font_name, font_size):
+    """
+    加载水印字体，每个进程对同一字体和大小只加载一次
+
+    Args:
+        font_name (str): 字体名称或字体文件路径
+        font_size (int): 字体大小
+
+    Returns:
+        ImageFont.FreeTypeFont: 字体对象
+    """
+    try:
+        return ImageFont.truetype(font_name, font_size)
+    except IOError:
+        # 如果无法加载指定字体，则使用默认字体
+        print(f"无法加载字体 {font_name}，使用默认字体")
+        return ImageFont.load_default(font_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _render_watermark_stamp(
+    datetime_str, font_name, font_size, text_color, outline_color
+):
+    """
+    将水印文本渲染为带描边的透明RGBA图章，相同的文本只渲染一次
+
+    Args:
+        datetime_str (str): 水印文本
+        font_name (str): 字体名称
+        font_size (int): 字体大小
+        text_color (tuple): 文字颜色
+        outline_color (tuple): 描边颜色
+
+    Returns:
+        tuple: (stamp, offset, text_size)，offset为图章左上角相对于文本绘制原点的偏移，
+               text_size为不含描边的文本尺寸，用于计算水印位置
+    """
+    font = _load_font(font_name, font_size)
+
+    # 不含描边的文本尺寸，与原来的水印位置计算方式保持一致
+    text_bbox = font.getbbox(datetime_str)
+    text_size = (text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1])
+
+    # 含描边的文本范围
+    stroke_width = 1
+    left, top, right, bottom = font.getbbox(datetime_str, stroke_width=stroke_width)
+
+    stamp = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    ImageDraw.Draw(stamp).text(
+        (-left, -top),
+        datetime_str,
+        font=font,
+        fill=text_color,
+        stroke_width=stroke_width,
+        stroke_fill=outline_color,
+    )
+
+    return stamp, (left, top), text_size
+
+
+def _draw_watermark(image, datetime_str, scale=1.0):
+    """
+    在内存中的图像上合成水印图章
+
+    Args:
+        image (PIL.Image.Image): 图像对象
+        datetime_str (str): 水印日期时间字符串
+        scale (float): 字体大小和边距的缩放比例（图像已经缩小时使用缩小的比例，
+            与先在原图上添加水印再缩小的效果一致）
+
+    Returns:
+        PIL.Image.Image: 添加水印后的图像对象（非RGB/RGBA图像会先转换模式）
+    """
+    stamp, (offset_x, offset_y), (text_width, text_height) = _render_watermark_stamp(
+        datetime_str,
+        config.WATERMARK_FONT,
+        max(1, round(config.WATERMARK_FONT_SIZE * scale)),
+        tuple(config.WATERMARK_TEXT_COLOR),
+        tuple(config.WATERMARK_OUTLINE_COLOR),
+    )
+
+    # 灰度、调色板、CMYK等模式的图像先转换为RGB（带透明度的转换为RGBA）
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "transparency" in image.info or image.mode in ("LA", "PA")
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    # 计算水印位置（右下角，带内边距）
+    padding = round(config.WATERMARK_PADDING * scale)
+    position = (
+        image.width - text_width - padding,
+        image.height - text_height - padding,
+    )
+
+    # 以图章的透明度作为蒙版，将白字黑边的水印合成到图像上
+    image.paste(stamp, (position[0] + offset_x, position[1] + offset_y), stamp)
+
+    return image
+
+
+def _get_output_path(image_path, extension=None):
+    """
+    获取处理后图像的输出路径（在原图像名前添加watermarked_前缀）
+
+    输出格式与源格式不同时保留源扩展名（如x.png输出为watermarked_x.png.jpg），
+    避免同一目录中的x.png和x.jpg写入同一个文件
+
+    Args:
+        image_path (str): 原图像路径
+        extension (str, optional): 输出扩展名，如果为None则与原图像相同
+
+    Returns:
+        str: 输出路径
+    """
+    dir_name = os.path.dirname(image_path)
+    file_name = os.path.basename(image_path)
+    source_extension = os.path.splitext(file_name)[1].lower()
+    if extension is not None and extension != source_extension:
+        file_name += extension
+    return os.path.join(dir_name, f"watermarked_{file_name}")
+
+
+def get_output_extension(image, image_path):
+    """
+    根据编码设置确定处理后图像的输出格式（只需要读取图像头）
+
+    IMAGE_OUTPUT_FORMAT为"source"时保持源格式；为"auto"时没有透明通道的PNG
+    （照片类PNG）转为JPEG；为"jpeg"时全部转为JPEG
+
+    Args:
+        image (PIL.Image.Image): 已打开的图像对象
+        image_path (str): 图像路径
+
+    Returns:
+        str: 输出扩展名
+    """
+    source_extension = os.path.splitext(image_path)[1].lower()
+    output_format = config.IMAGE_OUTPUT_FORMAT
+
+    if output_format == "jpeg":
+        return ".jpg"
+
+    if output_format == "auto" and image.format == "PNG":
+        has_alpha = image.mode in ("RGBA", "LA", "PA", "P") or "transparency" in image.info
+        if not has_alpha:
+            return ".jpg"
+
+    return source_extension
+
+
+def _save_image(image, output_path, extension=None):
+    """
+    按照编码设置保存图像
+
+    JPEG使用配置中的图像质量，可选优化编码和渐进式编码；PNG使用配置中的压缩级别
+
+    Args:
+        image (PIL.Image.Image): 图像对象
+        output_path (str or file): 输出路径，或者可写入的文件对象（如io.BytesIO）
+        extension (str, optional): 输出格式对应的扩展名，输出为文件对象时必须指定
+
+    Returns:
+        str or file: 输出路径或文件对象
+    """
+    if extension is None:
+        extension = os.path.splitext(output_path)[1]
+    image_format = Image.registered_extensions()[extension.lower()]
+
+    save_kwargs = {}
+    if config.IMAGE_STRIP_METADATA:
+        # 只保留颜色配置文件和透明色，去掉EXIF、注释等报告中用不到的元数据
+        image.info = {
+            key: value
+            for key, value in image.info.items()
+            if key in ("icc_profile", "transparency")
+        }
+        if "icc_profile" in image.info:
+            save_kwargs["icc_profile"] = image.info["icc_profile"]
+
+    if config.REPORT_IMAGE_DPI:
+        # 写入打印分辨率，使图片的原始尺寸与报告中的显示尺寸一致
+        save_kwargs["dpi"] = (config.REPORT_IMAGE_DPI, config.REPORT_IMAGE_DPI)
+
+    if image_format == "JPEG":
+        # JPEG不支持透明通道，带透明通道的图像合成到白色背景上
+        if image.mode in ("RGBA", "LA", "PA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+
+        save_kwargs["quality"] = config.IMAGE_QUALITY
+        save_kwargs["optimize"] = config.IMAGE_JPEG_OPTIMIZE
+        save_kwargs["progressive"] = config.IMAGE_JPEG_PROGRESSIVE
+    elif image_format == "PNG":
+        save_kwargs["compress_level"] = config.IMAGE_PNG_COMPRESS_LEVEL
+
+    image.save(output_path, format=image_format, **save_kwargs)
+
+    return output_path
+
+
+# 编码统计信息（本进程），用于报告每次运行节省的字节数
+_encode_stats = {"images": 0, "source_bytes": 0, "output_bytes": 0}
+
+
+def _record_encode_stats(image_path, output):
+    """
+    记录一张图像的源文件大小和处理后的大小
+    """
+    _encode_stats["images"] += 1
+    _encode_stats["source_bytes"] += os.path.getsize(image_path)
+    if isinstance(output, str):
+        _encode_stats["output_bytes"] += os.path.getsize(output)
+    else:
+        _encode_stats["output_bytes"] += output.getbuffer().nbytes
+
+
+def _merge_encode_stats(stats):
+    """
+    合并其他进程中的编码统计信息
+    """
+    for name, value in stats.items():
+        _encode_stats[name] += value
+
+
+def get_encode_stats():
+    """
+    获取编码统计信息
+
+    Returns:
+        dict: 包含images、source_bytes、output_bytes的统计信息
+    """
+    return dict(_encode_stats)
+
+
+def print_encode_stats():
+    """
+    打印本次运行的编码统计信息（处理前后的图像大小和节省的字节数）
+    """
+    stats = get_encode_stats()
+    if not stats["images"]:
+        return
+
+    saved = stats["source_bytes"] - stats["output_bytes"]
+    ratio = saved / stats["source_bytes"] * 100 if stats["source_bytes"] else 0.0
+    print(
+        f"图像编码统计: {stats['images']} 张图像，"
+        f"源文件 {stats['source_bytes'] / 1024 / 1024:.1f} MB，"
+        f"处理后 {stats['output_bytes'] / 1024 / 1024:.1f} MB，"
+        f"节省 {saved / 1024 / 1024:.1f} MB ({ratio:.1f}%)"
+    )
 
 
 def add_watermark(image_path, datetime_str=None, output_path=None):
@@ -26,74 +354,18 @@ def add_watermark(image_path, datetime_str=None, output_path=None):
         str: 添加水印后的图像路径
     """
     try:
-        # 打开图像
-        image = Image.open(image_path)
-
         # 如果没有指定日期时间，则使用当前时间
         if datetime_str is None:
             now = datetime.now()
             datetime_str = now.strftime("%Y-%m-%d %I:%M %p")
 
-        # 创建绘图对象
-        draw = ImageDraw.Draw(image)
-
-        # 加载字体
-        try:
-            font = ImageFont.truetype(config.WATERMARK_FONT, config.WATERMARK_FONT_SIZE)
-        except IOError:
-            # 如果无法加载指定字体，则使用默认字体
-            font = ImageFont.load_default(config.WATERMARK_FONT_SIZE)
-
-        # 计算水印文本的大小 - 兼容不同版本的Pillow
-        try:
-            # 对于Pillow 9.2.0及以上版本
-            text_bbox = font.getbbox(datetime_str)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-        except AttributeError:
-            try:
-                # 对于Pillow 8.x版本
-                text_width, text_height = font.getsize(datetime_str)
-            except AttributeError:
-                # 对于更旧版本的Pillow
-                text_width, text_height = draw.textsize(datetime_str, font=font)
-
-        # 计算水印位置（右下角，带内边距）
-        position = (
-            image.width - text_width - config.WATERMARK_PADDING,
-            image.height - text_height - config.WATERMARK_PADDING,
-        )
-
-        # 添加水印（黑色轮廓白色文字）
-        # 先绘制黑色轮廓
-        for offset_x, offset_y in [
-            (-1, -1),
-            (-1, 0),
-            (-1, 1),
-            (0, -1),
-            (0, 1),
-            (1, -1),
-            (1, 0),
-            (1, 1),
-        ]:
-            draw.text(
-                (position[0] + offset_x, position[1] + offset_y),
-                datetime_str,
-                font=font,
-                fill=config.WATERMARK_OUTLINE_COLOR,
-            )
-
-        # 再绘制白色文字
-        draw.text(position, datetime_str, font=font, fill=config.WATERMARK_TEXT_COLOR)
-
         # 如果没有指定输出路径，则在原图像名前添加watermarked_前缀
         if output_path is None:
-            dir_name = os.path.dirname(image_path)
-            file_name = os.path.basename(image_path)
-            output_path = os.path.join(dir_name, f"watermarked_{file_name}")
+            output_path = _get_output_path(image_path)
 
-        # 保存图像
-        image.save(output_path)
+        # 打开图像，添加水印并按照编码设置保存
+        with open_image(image_path) as image:
+            _save_image(_draw_watermark(image, datetime_str), output_path)
 
         return output_path
 
@@ -102,19 +374,183 @@ def add_watermark(image_path, datetime_str=None, output_path=None):
         return None
 
 
-def process_image_pair(image1_path, image2_path, datetime_obj=None):
+def _fit_size(width, height, max_width, max_height):
+    """
+    计算保持宽高比并且不超过最大尺寸限制的图像尺寸
+
+    Args:
+        width (int): 原始宽度
+        height (int): 原始高度
+        max_width (int): 最大宽度
+        max_height (int): 最大高度
+
+    Returns:
+        tuple: (new_width, new_height)
+    """
+    if width <= max_width and height <= max_height:
+        return (width, height)
+
+    # 计算缩放比例
+    ratio = min(max_width / width, max_height / height)
+    return (int(width * ratio), int(height * ratio))
+
+
+def get_max_image_size():
+    """
+    获取处理后图像的最大尺寸
+
+    设置了REPORT_IMAGE_DPI时，最大宽度不超过报告中图片实际显示宽度
+    （REPORT_IMAGE_WIDTH_INCHES）在该分辨率下所需的像素数
+
+    Returns:
+        tuple: (max_width, max_height)
+    """
+    max_width = config.IMAGE_MAX_WIDTH
+    max_height = config.IMAGE_MAX_HEIGHT
+
+    if config.REPORT_IMAGE_DPI:
+        print_width = round(config.REPORT_IMAGE_WIDTH_INCHES * config.REPORT_IMAGE_DPI)
+        max_width = min(max_width, print_width)
+
+    return (max_width, max_height)
+
+
+def plan_pair_sizes(size1, size2):
+    """
+    根据两张图像的原始尺寸计算最终输出尺寸，只需要读取图像头信息，不需要解码图像
+
+    先将超过最大尺寸限制的图像按比例缩小，如果两张图像尺寸仍然不同，
+    则统一调整为两者的最大宽度和最大高度
+
+    Args:
+        size1 (tuple): 第一张图像的原始尺寸 (width, height)
+        size2 (tuple): 第二张图像的原始尺寸 (width, height)
+
+    Returns:
+        tuple: (target_size1, target_size2)
+    """
+    # 如果未启用图像大小调整（也未设置打印分辨率），则保持原始尺寸
+    if not config.IMAGE_RESIZE_ENABLED and not config.REPORT_IMAGE_DPI:
+        return (size1, size2)
+
+    width1, height1 = size1
+    width2, height2 = size2
+    max_width, max_height = get_max_image_size()
+
+    # 首先检查是否超过最大尺寸限制
+    if width1 > max_width or height1 > max_height:
+        print(f"图像1超过最大尺寸限制，调整大小")
+        width1, height1 = _fit_size(width1, height1, max_width, max_height)
+
+    if width2 > max_width or height2 > max_height:
+        print(f"图像2超过最大尺寸限制，调整大小")
+        width2, height2 = _fit_size(width2, height2, max_width, max_height)
+
+    # 如果两张图像尺寸不同，则调整为相同大小
+    if width1 != width2 or height1 != height2:
+        print(f"图像尺寸不同，调整为相同大小")
+        print(f"图像1尺寸: {width1}x{height1}, 图像2尺寸: {width2}x{height2}")
+
+        # 计算目标尺寸（取两张图像的最大宽度和最大高度）
+        target_size = (max(width1, width2), max(height1, height2))
+        print(f"调整后的尺寸: {target_size[0]}x{target_size[1]}")
+        return (target_size, target_size)
+
+    return ((width1, height1), (width2, height2))
+
+
+def render_image(image, target_size, datetime_str):
+    """
+    在内存中完成单张图像的处理：一次性缩放到目标尺寸，然后添加水印
+
+    水印的字体大小和边距按缩放比例缩小，与原来先在原图上添加水印再缩小图像的效果保持一致
+
+    Args:
+        image (PIL.Image.Image): 已打开的图像对象
+        target_size (tuple): 目标尺寸 (width, height)
+        datetime_str (str): 水印日期时间字符串
+
+    Returns:
+        PIL.Image.Image: 处理后的图像对象
+    """
+    scale = 1.0
+    if image.size != tuple(target_size):
+        scale = min(target_size[0] / image.width, target_size[1] / image.height)
+
+        # JPEG图像先降采样解码到接近目标尺寸，再精确缩放
+        draft_image(image, target_size)
+        image = image.resize(tuple(target_size), Image.LANCZOS)
+
+    return _draw_watermark(image, datetime_str, scale)
+
+
+def _process_image(image, image_path, target_size, datetime_str, use_cache=True):
+    """
+    处理单张图像并保存，如果启用了图像缓存则优先使用缓存结果
+
+    Args:
+        image (PIL.Image.Image): 已打开的图像对象
+        image_path (str): 图像路径
+        target_size (tuple): 目标尺寸 (width, height)
+        datetime_str (str): 水印日期时间字符串
+        use_cache (bool): 是否使用图像缓存
+
+    Returns:
+        str or io.BytesIO: 处理后的图像路径；启用内存模式时为编码后的图像数据
+    """
+    extension = get_output_extension(image, image_path)
+
+    # 内存模式下处理结果保存在内存缓冲区中，不写入图像目录
+    if config.IMAGE_IN_MEMORY:
+        output = io.BytesIO()
+    else:
+        output = _get_output_path(image_path, extension)
+
+    key = None
+    if config.IMAGE_CACHE_ENABLED and use_cache:
+        # 源图像和处理参数都没有变化时直接使用缓存
+        key = image_cache.cache_key(image_path, target_size, datetime_str)
+        if image_cache.fetch(key, output):
+            print(f"使用缓存的处理结果: {os.path.basename(image_path)}")
+            _record_encode_stats(image_path, output)
+            if config.IMAGE_IN_MEMORY:
+                output.seek(0)
+            return output
+
+    _save_image(render_image(image, target_size, datetime_str), output, extension)
+    _record_encode_stats(image_path, output)
+
+    if key is not None:
+        image_cache.store(key, output, extension)
+
+    if config.IMAGE_IN_MEMORY:
+        output.seek(0)
+    return output
+
+
+def process_image_pair(image1_path, image2_path, datetime_obj=None, use_cache=None):
     """
     处理图像对，添加水印并调整为相同大小
 
+    每张图像只解码一次、编码一次：先读取图像头计算最终尺寸，
+    然后在内存中完成缩放、尺寸统一和水印，最后保存为watermarked_前缀的文件。
+    启用图像缓存时，源图像和处理参数都没有变化的图像直接使用缓存结果
+
     Args:
         image1_path (str): 第一张图像路径
         image2_path (str): 第二张图像路径
         datetime_obj (datetime, optional): 日期时间对象，如果为None则使用随机生成的日期时间
+        use_cache (bool, optional): 是否使用图像缓存，如果为None则只在指定了日期时间时使用
+            （随机生成的水印每次运行都不同，不可能命中缓存，缓存只会挤掉有用的条目）
 
     Returns:
-        tuple: (processed_image1_path, processed_image2_path, datetime_str)
+        tuple: (processed_image1, processed_image2, datetime_str)，processed_image为处理后的图像路径，
+               启用内存模式（IMAGE_IN_MEMORY）时为包含编码后图像数据的io.BytesIO
     """
     try:
+        if use_cache is None:
+            use_cache = datetime_obj is not None
+
         # 如果没有指定日期时间，则使用随机生成的日期时间
         if datetime_obj is None:
             datetime_obj = config.generate_random_datetime()
@@ -122,80 +558,18 @@ def process_image_pair(image1_path, image2_path, datetime_obj=None):
         # 格式化日期时间
         datetime_str = datetime_obj.strftime(config.WATERMARK_DATETIME_FORMAT)
 
-        # 为图像添加水印
-        processed_image1 = add_watermark(image1_path, datetime_str)
-        processed_image2 = add_watermark(image2_path, datetime_str)
-
-        if processed_image1 is None or processed_image2 is None:
-            return (None, None, None)
-
-        # 如果启用了图像大小调整，则调整图像大小
-        if config.IMAGE_RESIZE_ENABLED:
-            # 获取两张图像的尺寸
-            try:
-                img1 = Image.open(processed_image1)
-                img2 = Image.open(processed_image2)
-
-                width1, height1 = img1.size
-                width2, height2 = img2.size
-
-                # 首先检查是否超过最大尺寸限制
-                if width1 > config.IMAGE_MAX_WIDTH or height1 > config.IMAGE_MAX_HEIGHT:
-                    print(f"图像1超过最大尺寸限制，调整大小")
-                    # 计算缩放比例
-                    ratio1 = min(
-                        config.IMAGE_MAX_WIDTH / width1,
-                        config.IMAGE_MAX_HEIGHT / height1,
-                    )
-                    new_width1 = int(width1 * ratio1)
-                    new_height1 = int(height1 * ratio1)
-                    processed_image1 = resize_image(
-                        processed_image1, new_width1, new_height1
-                    )
-                    # 更新尺寸
-                    width1, height1 = new_width1, new_height1
-
-                if width2 > config.IMAGE_MAX_WIDTH or height2 > config.IMAGE_MAX_HEIGHT:
-                    print(f"图像2超过最大尺寸限制，调整大小")
-                    # 计算缩放比例
-                    ratio2 = min(
-                        config.IMAGE_MAX_WIDTH / width2,
-                        config.IMAGE_MAX_HEIGHT / height2,
-                    )
-                    new_width2 = int(width2 * ratio2)
-                    new_height2 = int(height2 * ratio2)
-                    processed_image2 = resize_image(
-                        processed_image2, new_width2, new_height2
-                    )
-                    # 更新尺寸
-                    width2, height2 = new_width2, new_height2
-
-                # 如果两张图像尺寸不同，则调整为相同大小
-                if width1 != width2 or height1 != height2:
-                    print(f"图像尺寸不同，调整为相同大小")
-                    print(
-                        f"图像1尺寸: {width1}x{height1}, 图像2尺寸: {width2}x{height2}"
-                    )
-
-                    # 计算目标尺寸（取两张图像的最大宽度和最大高度）
-                    target_width = max(width1, width2)
-                    target_height = max(height1, height2)
-
-                    # 调整图像大小
-                    if width1 != target_width or height1 != target_height:
-                        processed_image1 = resize_image(
-                            processed_image1, target_width, target_height
-                        )
-
-                    if width2 != target_width or height2 != target_height:
-                        processed_image2 = resize_image(
-                            processed_image2, target_width, target_height
-                        )
-
-                    print(f"调整后的尺寸: {target_width}x{target_height}")
-            except Exception as e:
-                print(f"获取或调整图像尺寸时出错: {e}")
-                # 如果出错，继续使用原始处理后的图像
+        # 打开图像（此时只读取了图像头，尚未解码像素数据）
+        with open_image(image1_path) as image1, open_image(image2_path) as image2:
+            # 根据图像头中的尺寸计算最终输出尺寸
+            target_size1, target_size2 = plan_pair_sizes(image1.size, image2.size)
+
+            # 在内存中完成缩放和水印，然后一次性保存
+            processed_image1 = _process_image(
+                image1, image1_path, target_size1, datetime_str, use_cache
+            )
+            processed_image2 = _process_image(
+                image2, image2_path, target_size2, datetime_str, use_cache
+            )
 
         return (processed_image1, processed_image2, datetime_str)
 
@@ -204,6 +578,80 @@ def process_image_pair(image1_path, image2_path, datetime_obj=None):
         return (None, None, None)
 
 
+def _init_pool_worker(config_values):
+    """
+    进程池工作进程初始化函数，同步主进程中的配置（命令行参数可能修改过配置）
+
+    Args:
+        config_values (dict): 主进程中的配置项
+    """
+    for name, value in config_values.items():
+        setattr(config, name, value)
+
+
+def _process_image_pair_job(job):
+    """
+    进程池任务入口，job为process_image_pair的参数元组
+
+    Returns:
+        tuple: (process_image_pair的返回值, 该任务的编码统计信息)
+    """
+    before = get_encode_stats()
+    result = process_image_pair(*job)
+    stats = {name: value - before[name] for name, value in _encode_stats.items()}
+    return result, stats
+
+
+def process_image_pairs(jobs, workers=1):
+    """
+    批量处理图像对，可使用进程池并行处理
+
+    Args:
+        jobs (list): 任务列表，每个元素是一个元组 (image1_path, image2_path, datetime_obj)
+        workers (int): 工作进程数量，小于等于1时顺序处理
+
+    Returns:
+        list: 与jobs顺序一致的处理结果列表，每个元素是process_image_pair的返回值，
+              处理失败的图像对为 (None, None, None)
+    """
+    if workers is None or workers <= 1 or len(jobs) <= 1:
+        return [process_image_pair(*job) for job in jobs]
+
+    # 工作进程由fork产生，继承相同的随机数状态，随机日期时间在主进程中生成，避免各进程生成相同的日期时间；
+    # 随机日期时间的图像对仍然不使用缓存
+    jobs = [
+        (
+            image1_path,
+            image2_path,
+            datetime_obj or config.generate_random_datetime(),
+            datetime_obj is not None,
+        )
+        for image1_path, image2_path, datetime_obj in jobs
+    ]
+
+    # 将主进程中的配置传给工作进程
+    config_values = {
+        name: getattr(config, name) for name in dir(config) if name.isupper()
+    }
+
+    try:
+        print(f"使用 {min(workers, len(jobs))} 个进程并行处理 {len(jobs)} 对图像")
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)),
+            initializer=_init_pool_worker,
+            initargs=(config_values,),
+        ) as executor:
+            # executor.map按提交顺序返回结果
+            results = []
+            for result, stats in executor.map(_process_image_pair_job, jobs):
+                _merge_encode_stats(stats)
+                results.append(result)
+            return results
+    except Exception as e:
+        print(f"并行处理图像对时出错: {e}，改为顺序处理")
+        return [process_image_pair(*job) for job in jobs]
+
+
 def get_image_pairs(images_dir):
     """
     获取图像对
@@ -238,6 +686,34 @@ def get_image_pairs(images_dir):
     return image_pairs
 
 
+def get_image_files(images_dir, sort_by_mtime=False):
+    """
+    获取目录中（不包含子目录）的所有图像文件
+
+    Args:
+        images_dir (str): 图像目录路径
+        sort_by_mtime (bool): 是否按照修改时间排序
+
+    Returns:
+        list: 图像文件路径列表
+    """
+    if config.IMAGE_MANIFEST_ENABLED:
+        # 使用图像清单，修改时间已记录在清单中（按修改时间排序时核对原地覆盖的文件）
+        entries = image_manifest.scan_directory(images_dir, revalidate=sort_by_mtime)
+        if sort_by_mtime:
+            entries = sorted(entries, key=lambda entry: entry.mtime)
+        return [entry.path for entry in entries]
+
+    image_files = []
+    for ext in ["*.jpg", "*.jpeg", "*.png"]:
+        image_files.extend(glob.glob(os.path.join(images_dir, ext)))
+
+    if sort_by_mtime:
+        image_files.sort(key=os.path.getmtime)
+
+    return image_files
+
+
 def get_manual_image_pairs(images_dir, input_data=None):
     """
     从images/before和images/after目录获取手动配对的图像对，按input.csv顺序排序
@@ -261,24 +737,30 @@ def get_manual_image_pairs(images_dir, input_data=None):
     before_images = {}
     after_images = {}
 
-    # 更新正则表达式匹配模式
-    before_pattern = re.compile(r"^(\d+)_(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
-    after_pattern = re.compile(r"^(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
-
-    # 处理before目录
-    for file in os.listdir(before_dir):
-        match = before_pattern.match(file)
-        if match:
-            pairing_id = int(match.group(1))
-            capa_index = int(match.group(2))
-            before_images[pairing_id] = (os.path.join(before_dir, file), capa_index)
-
-    # 处理after目录
-    for file in os.listdir(after_dir):
-        match = after_pattern.match(file)
-        if match:
-            pairing_id = int(match.group(1))
-            after_images[pairing_id] = os.path.join(after_dir, file)
+    if config.IMAGE_MANIFEST_ENABLED:
+        # 使用图像清单，文件名中的pairing_id和capa_index已在扫描时解析
+        for entry in image_manifest.scan_directory(before_dir):
+            if entry.capa_index is not None:
+                before_images[entry.pairing_id] = (entry.path, entry.capa_index)
+
+        for entry in image_manifest.scan_directory(after_dir):
+            if entry.pairing_id is not None and entry.capa_index is None:
+                after_images[entry.pairing_id] = entry.path
+    else:
+        # 处理before目录
+        for file in os.listdir(before_dir):
+            match = image_manifest.BEFORE_PATTERN.match(file)
+            if match:
+                pairing_id = int(match.group(1))
+                capa_index = int(match.group(2))
+                before_images[pairing_id] = (os.path.join(before_dir, file), capa_index)
+
+        # 处理after目录
+        for file in os.listdir(after_dir):
+            match = image_manifest.AFTER_PATTERN.match(file)
+            if match:
+                pairing_id = int(match.group(1))
+                after_images[pairing_id] = os.path.join(after_dir, file)
 
     # 获取input.csv中的顺序
     input_order = []
@@ -328,7 +810,7 @@ def resize_image(image_path, target_width=None, target_height=None, output_path=
     """
     try:
         # 打开图像
-        image = Image.open(image_path)
+        image = open_image(image_path)
 
         # 获取原始尺寸
         original_width, original_height = image.size
@@ -361,13 +843,7 @@ def resize_image(image_path, target_width=None, target_height=None, output_path=
             output_path = image_path
 
         # 保存图像，使用配置中的图像质量
-        if output_path.lower().endswith((".jpg", ".jpeg")):
-            resized_image.save(output_path, quality=config.IMAGE_QUALITY)
-        else:
-            # 对于非JPEG格式，不指定质量参数
-            resized_image.save(output_path)
-
-        return output_path
+        return _save_image(resized_image, output_path)
 
     except Exception as e:
         print(f"调整图像大小时出错: {e}")
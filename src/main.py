@@ -10,16 +10,19 @@ import sys
 import argparse
 from datetime import datetime
 import random
-import glob
 
 # 添加当前目录到系统路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import config
 import image_processor
+import image_cache
+import image_dedup
 import data_processor
 import report_generator
 import ai_processor
+import ai_server
+import image_pairing
 
 
 def parse_args():
@@ -57,6 +60,46 @@ def parse_args():
     # AI参数
     parser.add_argument("--ai", action="store_true", help="使用AI识别图片内容")
     parser.add_argument("--no-ai", action="store_true", help="不使用AI识别图片内容")
+    parser.add_argument(
+        "--clip-model",
+        choices=config.CLIP_MODELS,
+        help="AI识别使用的CLIP模型：ViT-B-32最快，ViT-L-14最准确",
+        default=config.CLIP_MODEL,
+    )
+    parser.add_argument(
+        "--cascade",
+        choices=["stats"] + config.CLIP_MODELS,
+        help="使用级联判断：先用指定的快速模型（或stats亮度统计）判断，只有不确定的图像对才交给主模型",
+        default=None,
+    )
+    parser.add_argument(
+        "--pairing",
+        choices=["assignment", "sequential"],
+        help="自动模式的配对方式：assignment按内容和拍摄时间全局匹配，sequential按修改时间相邻两两配对",
+        default=config.AI_PAIRING_MODE,
+    )
+    parser.add_argument(
+        "--ai-workers",
+        type=int,
+        help="并行编码图片的进程数，工作进程共享同一份CLIP模型",
+        default=config.AI_WORKERS,
+    )
+    parser.add_argument(
+        "--serve-ai",
+        action="store_true",
+        help="启动常驻的本地AI推理服务，之后的AI模式运行直接使用已加载的模型",
+    )
+    parser.add_argument(
+        "--train-probe",
+        action="store_true",
+        help="使用images/before和images/after中的历史图片训练'之前/之后'线性探针",
+    )
+    parser.add_argument(
+        "--clip-precision",
+        choices=config.CLIP_PRECISIONS,
+        help="CLIP图像编码器的推理精度：fp32、int8（动态量化）、bf16（需要CPU支持）",
+        default=config.CLIP_PRECISION,
+    )
 
     # 模式参数
     parser.add_argument(
@@ -79,6 +122,58 @@ def parse_args():
         "--use-template", action="store_true", help="使用模板文件生成报告"
     )
 
+    # 性能参数
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="并行处理图像对的进程数量，1表示顺序处理",
+        default=config.IMAGE_WORKERS,
+    )
+
+    parser.add_argument(
+        "--dpi",
+        type=int,
+        help="报告中图片的打印分辨率（如150或220），按显示宽度计算所需像素并缩小图片",
+        default=config.REPORT_IMAGE_DPI,
+    )
+    parser.add_argument(
+        "--image-format",
+        choices=["auto", "jpeg", "source"],
+        help="处理后图像的输出格式：auto照片类PNG转为JPEG，jpeg全部转为JPEG，source保持源格式",
+        default=config.IMAGE_OUTPUT_FORMAT,
+    )
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="处理后的图像保存在内存中直接写入报告，不在图片文件夹中生成watermarked_文件",
+    )
+
+    parser.add_argument(
+        "--dedup",
+        choices=["flag", "collapse"],
+        help="自动模式下检测近似重复的图像：flag只提示，collapse每组只保留一张",
+        default=None,
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=int,
+        help="近似重复判断的汉明距离阈值（0-64）",
+        default=config.DEDUP_HAMMING_THRESHOLD,
+    )
+
+    # 缓存参数
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不使用处理后图像的缓存"
+    )
+    parser.add_argument(
+        "--cache-stats", action="store_true", help="显示图像缓存的命中统计信息并退出"
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help="不使用图像清单，每次运行都重新扫描图像目录",
+    )
+
     # 位置参数
     parser.add_argument("--location", help="设置所有图像对的位置信息", default="")
     parser.add_argument(
@@ -144,6 +239,9 @@ def process_images(args):
             print(f"读取位置文件时出错: {e}")
             locations_from_file = []
 
+    # 并行处理图像对的进程数量
+    workers = args.workers if hasattr(args, "workers") else config.IMAGE_WORKERS
+
     if args.manual_mode:
         # 修改调用方式，传入input_data
         image_pairs = image_processor.get_manual_image_pairs(args.images_dir, input_data)
@@ -153,7 +251,10 @@ def process_images(args):
             return None
 
         # 移除之前的排序逻辑，直接处理image_pairs
-        for i, (before_image, after_image, capa_index, pairing_id) in enumerate(image_pairs):
+        # 先收集每个图像对的位置和日期信息，再批量处理图像
+        jobs = []
+        pair_locations = []
+        for before_image, after_image, capa_index, pairing_id in image_pairs:
             # 获取位置和日期信息（如果有）
             location = default_location
             datetime_obj = None
@@ -187,13 +288,17 @@ def process_images(args):
                         f"图像对 {pairing_id} (CAPA索引 {capa_index}) 使用input CSV中的日期: {date_from_input.strftime('%Y-%m-%d')}"
                     )
 
-            # 处理图像对，添加水印
-            processed_before, processed_after, datetime_str = (
-                image_processor.process_image_pair(
-                    before_image, after_image, datetime_obj
-                )
-            )
+            jobs.append((before_image, after_image, datetime_obj))
+            pair_locations.append(location)
+
+        # 处理图像对，添加水印
+        results = image_processor.process_image_pairs(jobs, workers)
 
+        for i, (
+            (before_image, after_image, capa_index, pairing_id),
+            (processed_before, processed_after, datetime_str),
+            location,
+        ) in enumerate(zip(image_pairs, results, pair_locations)):
             if processed_before is None or processed_after is None:
                 print(f"处理图像对 {i+1} 失败，跳过")
                 continue
@@ -243,64 +348,91 @@ def process_images(args):
     else:
         # 自动模式：使用AI识别图像内容
         if args.ai:
-            # 获取所有图像文件
-            image_files = []
-            for ext in ["*.jpg", "*.jpeg", "*.png"]:
-                image_files.extend(glob.glob(os.path.join(args.images_dir, ext)))
-
-            # 确保有偶数个图像
-            if len(image_files) % 2 != 0:
-                image_files = image_files[:-1]
-
-            # 按照修改时间排序
-            image_files.sort(key=os.path.getmtime)
+            # 获取所有图像文件，按照修改时间排序
+            image_files = image_processor.get_image_files(
+                args.images_dir, sort_by_mtime=True
+            )
 
-            # 两两配对处理
-            for i in range(0, len(image_files), 2):
-                if i + 1 < len(image_files):
-                    image1 = image_files[i]
-                    image2 = image_files[i + 1]
+            # 检测近似重复的图像（在AI分析和水印处理之前）
+            if config.DEDUP_ENABLED:
+                image_files = image_dedup.deduplicate(image_files)
 
-                    # 使用AI分析图像对
-                    before_image, after_image, best_description = (
-                        ai_processor.analyze_image_pair(image1, image2)
-                    )
+            interrogator = None
+            if config.AI_PAIRING_MODE == "assignment":
+                interrogator = ai_processor.get_clip_interrogator()
+                if interrogator is None:
+                    print("CLIP不可用，按修改时间相邻两两配对")
 
+            if interrogator is not None:
+                # 按内容相似度和拍摄时间全局配对，配对时已经确定了"之前/之后"图片和内容描述，
+                # 相似度过低的图像不配对
+                analyzed_pairs, _ = image_pairing.pair_images(image_files, interrogator)
+            else:
+                # 确保有偶数个图像
+                if len(image_files) % 2 != 0:
+                    image_files = image_files[:-1]
+
+                # 两两配对，使用AI批量分析所有图像对
+                candidate_pairs = [
+                    (image_files[i], image_files[i + 1])
+                    for i in range(0, len(image_files), 2)
+                    if i + 1 < len(image_files)
+                ]
+
+                analyzed_pairs = []
+                for (image1, image2), (before_image, after_image, best_description) in zip(
+                    candidate_pairs, ai_processor.analyze_image_pairs(candidate_pairs)
+                ):
                     if before_image is None or after_image is None:
                         print(f"分析图像对 {image1} 和 {image2} 失败，跳过")
                         continue
 
-                    # 处理图像对，添加水印
-                    processed_before, processed_after, datetime_str = (
-                        image_processor.process_image_pair(before_image, after_image)
-                    )
+                    analyzed_pairs.append((before_image, after_image, best_description))
 
-                    if processed_before is None or processed_after is None:
-                        print(f"处理图像对 {before_image} 和 {after_image} 失败，跳过")
-                        continue
+            # 处理图像对，添加水印
+            results = image_processor.process_image_pairs(
+                [
+                    (before_image, after_image, None)
+                    for before_image, after_image, _ in analyzed_pairs
+                ],
+                workers,
+            )
 
-                    # 查找最匹配的描述和纠正措施
-                    description, action = ai_processor.find_best_description_match(
-                        best_description, descriptions_and_actions
-                    )
+            # 查找最匹配的描述和纠正措施（使用"之前"图片与CAPA描述做语义匹配）
+            matches = ai_processor.find_best_description_matches(
+                [best_description for _, _, best_description in analyzed_pairs],
+                descriptions_and_actions,
+                [before_image for before_image, _, _ in analyzed_pairs],
+            )
 
-                    # 添加到结果列表
-                    image_pairs_with_data.append(
-                        (processed_before, processed_after, description, action)
-                    )
+            for (before_image, after_image, best_description), (
+                processed_before,
+                processed_after,
+                datetime_str,
+            ), (description, action) in zip(analyzed_pairs, results, matches):
+                if processed_before is None or processed_after is None:
+                    print(f"处理图像对 {before_image} 和 {after_image} 失败，跳过")
+                    continue
+
+                # 添加到结果列表
+                image_pairs_with_data.append(
+                    (processed_before, processed_after, description, action)
+                )
 
-                    # 添加位置信息
-                    location_index = len(image_pairs_with_data) - 1
-                    if location_index < len(locations_from_file):
-                        locations.append(locations_from_file[location_index])
-                    else:
-                        locations.append(default_location)
+                # 添加位置信息
+                location_index = len(image_pairs_with_data) - 1
+                if location_index < len(locations_from_file):
+                    locations.append(locations_from_file[location_index])
+                else:
+                    locations.append(default_location)
         else:
             # 不使用AI，随机配对图像
             # 获取所有图像文件
-            image_files = []
-            for ext in ["*.jpg", "*.jpeg", "*.png"]:
-                image_files.extend(glob.glob(os.path.join(args.images_dir, ext)))
+            image_files = image_processor.get_image_files(args.images_dir)
+
+            # 检测近似重复的图像（在水印处理之前）
+            if config.DEDUP_ENABLED:
+                image_files = image_dedup.deduplicate(image_files)
 
             # 确保有偶数个图像
             if len(image_files) % 2 != 0:
@@ -309,35 +441,45 @@ def process_images(args):
             # 随机打乱图像顺序
             random.shuffle(image_files)
 
-            # 两两配对处理
-            for i in range(0, len(image_files), 2):
-                if i + 1 < len(image_files):
-                    image1 = image_files[i]
-                    image2 = image_files[i + 1]
+            # 两两配对
+            image_file_pairs = [
+                (image_files[i], image_files[i + 1])
+                for i in range(0, len(image_files), 2)
+                if i + 1 < len(image_files)
+            ]
 
-                    # 处理图像对，添加水印
-                    processed_image1, processed_image2, datetime_str = (
-                        image_processor.process_image_pair(image1, image2)
-                    )
+            # 处理图像对，添加水印
+            results = image_processor.process_image_pairs(
+                [(image1, image2, None) for image1, image2 in image_file_pairs],
+                workers,
+            )
 
-                    if processed_image1 is None or processed_image2 is None:
-                        print(f"处理图像对 {image1} 和 {image2} 失败，跳过")
-                        continue
+            for (image1, image2), (
+                processed_image1,
+                processed_image2,
+                datetime_str,
+            ) in zip(image_file_pairs, results):
+                if processed_image1 is None or processed_image2 is None:
+                    print(f"处理图像对 {image1} 和 {image2} 失败，跳过")
+                    continue
 
-                    # 随机选择描述和纠正措施
-                    description, action = random.choice(descriptions_and_actions)
+                # 随机选择描述和纠正措施
+                description, action = random.choice(descriptions_and_actions)
 
-                    # 添加到结果列表
-                    image_pairs_with_data.append(
-                        (processed_image1, processed_image2, description, action)
-                    )
+                # 添加到结果列表
+                image_pairs_with_data.append(
+                    (processed_image1, processed_image2, description, action)
+                )
 
-                    # 添加位置信息
-                    location_index = len(image_pairs_with_data) - 1
-                    if location_index < len(locations_from_file):
-                        locations.append(locations_from_file[location_index])
-                    else:
-                        locations.append(default_location)
+                # 添加位置信息
+                location_index = len(image_pairs_with_data) - 1
+                if location_index < len(locations_from_file):
+                    locations.append(locations_from_file[location_index])
+                else:
+                    locations.append(default_location)
+
+    # 打印图像编码统计信息
+    image_processor.print_encode_stats()
 
     # 生成报告
     if image_pairs_with_data:
@@ -361,6 +503,57 @@ def main():
     # 解析命令行参数
     args = parse_args()
 
+    # 显示缓存统计信息
+    if hasattr(args, "cache_stats") and args.cache_stats:
+        image_cache.print_stats()
+        return
+
+    if hasattr(args, "no_cache") and args.no_cache:
+        config.IMAGE_CACHE_ENABLED = False
+
+    if hasattr(args, "no_manifest") and args.no_manifest:
+        config.IMAGE_MANIFEST_ENABLED = False
+
+    if hasattr(args, "in_memory") and args.in_memory:
+        config.IMAGE_IN_MEMORY = True
+
+    if hasattr(args, "dpi") and args.dpi:
+        config.REPORT_IMAGE_DPI = args.dpi
+
+    if hasattr(args, "image_format") and args.image_format:
+        config.IMAGE_OUTPUT_FORMAT = args.image_format
+
+    if hasattr(args, "clip_model") and args.clip_model:
+        config.CLIP_MODEL = args.clip_model
+
+    if hasattr(args, "clip_precision") and args.clip_precision:
+        config.CLIP_PRECISION = args.clip_precision
+
+    if hasattr(args, "cascade") and args.cascade:
+        config.AI_CASCADE_ENABLED = True
+        config.AI_CASCADE_FAST_MODEL = args.cascade
+
+    if hasattr(args, "pairing") and args.pairing:
+        config.AI_PAIRING_MODE = args.pairing
+
+    if hasattr(args, "ai_workers") and args.ai_workers:
+        config.AI_WORKERS = args.ai_workers
+
+    # 启动本地AI推理服务（使用上面的模型和精度设置）
+    if hasattr(args, "serve_ai") and args.serve_ai:
+        ai_server.serve()
+        return
+
+    # 训练"之前/之后"线性探针
+    if hasattr(args, "train_probe") and args.train_probe:
+        ai_processor.train_linear_probe(args.images_dir)
+        return
+
+    if hasattr(args, "dedup") and args.dedup:
+        config.DEDUP_ENABLED = True
+        config.DEDUP_MODE = args.dedup
+        config.DEDUP_HAMMING_THRESHOLD = args.dedup_threshold
+
     # 打印欢迎信息
     print("=" * 50)
     print("日报表生成器")
@@ -374,6 +567,8 @@ def main():
         print(f"报告模板文件: {args.template}")
     print(f"使用AI: {'是' if args.ai else '否'}")
     print(f"手动模式: {'是' if args.manual_mode else '否'}")
+    if hasattr(args, "workers") and args.workers > 1:
+        print(f"并行进程数: {args.workers}")
     print(
         f"使用input CSV: {'是' if hasattr(args, 'use_input') and args.use_input else '否'}"
     )
@@ -57,8 +57,8 @@ def add_image_pair_to_report(
 
     Args:
         doc (docx.Document): 文档对象
-        original_image_path (str): 原始图片路径
-        corrected_image_path (str): 纠正后的图片路径
+        original_image_path (str or file): 原始图片路径或包含图片数据的文件对象
+        corrected_image_path (str or file): 纠正后的图片路径或包含图片数据的文件对象
         description (str): 描述
         action (str): 纠正措施
         location (str, optional): 位置信息，默认为空
@@ -112,12 +112,12 @@ def add_image_pair_to_report(
     before_img_cell = images_table.cell(1, 0)
     before_img_para = before_img_cell.paragraphs[0]
     before_img_run = before_img_para.add_run()
-    before_img_run.add_picture(original_image_path, width=Inches(3.0))
+    before_img_run.add_picture(original_image_path, width=Inches(config.REPORT_IMAGE_WIDTH_INCHES))
 
     after_img_cell = images_table.cell(1, 1)
     after_img_para = after_img_cell.paragraphs[0]
     after_img_run = after_img_para.add_run()
-    after_img_run.add_picture(corrected_image_path, width=Inches(3.0))
+    after_img_run.add_picture(corrected_image_path, width=Inches(config.REPORT_IMAGE_WIDTH_INCHES))
 
     # 第四行为描述和纠正措施表格
     desc_cell = main_table.cell(3, 0)
@@ -171,8 +171,8 @@ def add_image_pair_to_template_page(
     Args:
         doc (docx.Document): 文档对象
         page_index (int): 页面索引
-        original_image_path (str): 原始图片路径
-        corrected_image_path (str): 纠正后的图片路径
+        original_image_path (str or file): 原始图片路径或包含图片数据的文件对象
+        corrected_image_path (str or file): 纠正后的图片路径或包含图片数据的文件对象
         description (str): 描述
         action (str): 纠正措施
         location (str, optional): 位置信息，默认为空
@@ -231,7 +231,7 @@ def add_image_pair_to_template_page(
         before_img_cell.text = ""  # 清除单元格内容
         before_img_para = before_img_cell.paragraphs[0]
         before_img_run = before_img_para.add_run()
-        before_img_run.add_picture(original_image_path, width=Inches(3.0))
+        before_img_run.add_picture(original_image_path, width=Inches(config.REPORT_IMAGE_WIDTH_INCHES))
     else:
         print("警告：未找到Before图片单元格")
 
@@ -239,7 +239,7 @@ def add_image_pair_to_template_page(
         after_img_cell.text = ""  # 清除单元格内容
         after_img_para = after_img_cell.paragraphs[0]
         after_img_run = after_img_para.add_run()
-        after_img_run.add_picture(corrected_image_path, width=Inches(3.0))
+        after_img_run.add_picture(corrected_image_path, width=Inches(config.REPORT_IMAGE_WIDTH_INCHES))
     else:
         print("警告：未找到After图片单元格")
 
@@ -311,7 +311,8 @@ def generate_report(image_pairs_with_data, locations=None):
 
     Args:
         image_pairs_with_data (list): 图片对及其数据的列表，每个元素是一个元组
-                                     (原始图片路径, 纠正后的图片路径, 描述, 纠正措施)
+                                     (原始图片路径, 纠正后的图片路径, 描述, 纠正措施)，
+                                     图片也可以是包含图片数据的文件对象（如io.BytesIO）
         locations (list, optional): 位置信息列表，与image_pairs_with_data一一对应，默认为None
 
     Returns:
@@ -346,7 +347,8 @@ def generate_report_from_template(
 
     Args:
         image_pairs_with_data (list): 图片对及其数据的列表，每个元素是一个元组
-                                     (原始图片路径, 纠正后的图片路径, 描述, 纠正措施)
+                                     (原始图片路径, 纠正后的图片路径, 描述, 纠正措施)，
+                                     图片也可以是包含图片数据的文件对象（如io.BytesIO）
         locations (list, optional): 位置信息列表，与image_pairs_with_data一一对应，默认为None
         template_path (str, optional): 模板文件路径，如果为None则使用默认模板
 
@@ -382,8 +384,8 @@ def generate_report_from_template(
                 {
                     'location': locations[i] if locations and i < len(locations) else "",
                     # 使用docxtpl的Inches转换图片尺寸
-                    'original_image': InlineImage(doc, original_image, width=Inches(3.0)),
-                    'corrected_image': InlineImage(doc, corrected_image, width=Inches(3.0)),
+                    'original_image': InlineImage(doc, original_image, width=Inches(config.REPORT_IMAGE_WIDTH_INCHES)),
+                    'corrected_image': InlineImage(doc, corrected_image, width=Inches(config.REPORT_IMAGE_WIDTH_INCHES)),
                     'description': description,
                     'action': action
                 } 